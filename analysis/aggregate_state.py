@@ -0,0 +1,134 @@
+import metrics
+import os
+import pandas as pd
+import pickle
+from analysis import buildings
+from analysis import items
+from analysis import parse_cache
+from analysis import picks_bans
+from analysis import report
+
+
+#############################
+# Sums two tallies that are indexed by the same keys (e.g. hero ID); keys missing from either count as 0.
+#############################
+def add_counts(old: pd.DataFrame, new: pd.DataFrame):
+    return old.add(new, fill_value=0).astype(int)
+
+
+#############################
+# Everything the reports are computed from, aggregated over the matches parsed so far, along with
+# the IDs of those matches. The aggregates of new matches are merged into the earlier ones, so a run
+# only needs to go through the new matches and still produces the same report as going through all.
+#############################
+class AggregateState:
+    # Bumped whenever the aggregates change; a state saved by an older version is rebuilt
+    VERSION = 2
+
+    def __init__(self):
+        self.version = AggregateState.VERSION
+        self.match_ids = set()
+        self.aggregates = None
+
+    @staticmethod
+    def compute(player_df, pickban_df, buildings_df):
+        pickban_df = picks_bans.prepare(pickban_df)
+        item_df = items.item_rows(player_df)
+        return {
+            "matches": len(buildings_df),
+            "pickban_matches": pickban_df["match_id"].nunique(),
+            "players": report.player_aggregates(player_df),
+            "heroes": picks_bans.hero_counts(pickban_df),
+            "phases": picks_bans.phase_counts(pickban_df),
+            "pairs": picks_bans.pair_counts(pickban_df),
+            "standing": buildings.count_standing(buildings_df),
+            "destruction": buildings.destruction_counts(buildings_df),
+            "items": items.item_counts(item_df),
+            "hero_items": items.hero_item_counts(item_df),
+            "hero_games": items.hero_game_counts(player_df),
+        }
+
+    @staticmethod
+    def merge(old, new):
+        return {
+            "matches": old["matches"] + new["matches"],
+            "pickban_matches": old["pickban_matches"] + new["pickban_matches"],
+            "players": report.merge_player_aggregates(old["players"], new["players"]),
+            "heroes": add_counts(old["heroes"], new["heroes"]),
+            "phases": add_counts(old["phases"], new["phases"]),
+            "pairs": add_counts(old["pairs"], new["pairs"]),
+            "standing": [
+                [a + b for a, b in zip(old_counter, new_counter)]
+                for old_counter, new_counter in zip(old["standing"], new["standing"])
+            ],
+            "destruction": add_counts(old["destruction"], new["destruction"]),
+            "items": add_counts(old["items"], new["items"]),
+            "hero_items": add_counts(old["hero_items"], new["hero_items"]),
+            "hero_games": add_counts(old["hero_games"], new["hero_games"]),
+        }
+
+    def fold(self, player_df, pickban_df, buildings_df):
+        new = self.compute(player_df, pickban_df, buildings_df)
+        self.aggregates = new if self.aggregates is None else self.merge(self.aggregates, new)
+        self.match_ids |= set(buildings_df["match_id"].astype(str))
+
+
+def state_path(directory=None):
+    if directory is None:
+        directory = parse_cache.season_directory()
+    return f"{directory}/aggregate_state.pkl"
+
+
+def load_state(path=None):
+    if path is None:
+        path = state_path()
+    if not os.path.isfile(path):
+        return AggregateState()
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    if getattr(state, "version", 1) != AggregateState.VERSION:
+        print("The aggregate state was saved by an older version; going through all the matches again.")
+        return AggregateState()
+    return state
+
+
+def save_state(state, path=None):
+    if path is None:
+        path = state_path()
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(f"{path}.tmp", "wb") as f:
+        pickle.dump(state, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def filter_tables(tables, match_ids):
+    return tuple(table[table["match_id"].astype(str).isin(match_ids)] for table in tables)
+
+
+#############################
+# Folds the matches that are not in the state yet into it. The new matches are normally exactly
+# the ones just added to the parse cache; if the state is behind the cache (e.g. it was deleted),
+# the missing matches are read from the cache instead. Without pyarrow they are extracted directly.
+#############################
+@metrics.timed
+def update_state(state, store, workers=1):
+    try:
+        new_tables = parse_cache.update_cache(store, workers=workers)
+        missing = parse_cache.cached_match_ids() - state.match_ids
+        if len(missing) == 0:
+            tables = None
+        elif new_tables is not None and set(new_tables[2]["match_id"].astype(str)) == missing:
+            tables = new_tables
+        else:
+            tables = filter_tables(parse_cache.load_tables(), missing)
+    except ImportError:
+        print("Parquet support (pyarrow) is not installed; extracting the new matches without the cache.")
+        missing = [m for m in store.match_ids() if m not in state.match_ids]
+        tables = parse_cache.extract_tables(store, missing, workers) if len(missing) > 0 else None
+
+    print(f"{len(state.match_ids)} matches in the aggregate state, adding {len(missing)} new ones.")
+    if tables is not None:
+        with metrics.stage("fold"):
+            state.fold(*tables)
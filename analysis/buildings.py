@@ -0,0 +1,113 @@
+import constants
+import numpy as np
+import pandas as pd
+
+# The building statuses are integer bitmasks where 1 means the building stands and 0 that it has fallen.
+# Even though they are represented by 8-bit and 16-bit binaries, respectively only 6 and 11 of
+# those bits are used and thus meaningful. The names are in the order of the bits, most significant first.
+BARRACKS = ["BOT RANGED", "BOT MELEE", "MID RANGED", "MID MELEE", "TOP RANGED", "TOP MELEE"]
+TOWERS = [
+    "BOT TIER 4",
+    "TOP TIER 4",
+    "BOT TIER 3",
+    "BOT TIER 2",
+    "BOT TIER 1",
+    "MID TIER 3",
+    "MID TIER 2",
+    "MID TIER 1",
+    "TOP TIER 3",
+    "TOP TIER 2",
+    "TOP TIER 1",
+]
+
+# (team, kind of building, column in the buildings table, building names)
+BUILDING_STATUSES = [
+    ("dire", "barracks", "barracks_status_dire", BARRACKS),
+    ("radiant", "barracks", "barracks_status_radiant", BARRACKS),
+    ("dire", "towers", "tower_status_dire", TOWERS),
+    ("radiant", "towers", "tower_status_radiant", TOWERS),
+]
+
+DESTRUCTION_INDEX = ["team", "kind", "building", "team_won", "duration_bucket"]
+
+
+#############################
+# Splits an array of bitmasks into a matrix with a column for each bit, most significant bit first.
+#############################
+def bit_matrix(bitmasks, width):
+    shifts = np.arange(width - 1, -1, -1)
+    return (np.asarray(bitmasks, dtype=np.int64)[:, None] >> shifts) & 1
+
+
+#############################
+# Counts how many times each building was left standing over all the matches, for dire and radiant
+# barracks and towers respectively. This allows us to see which buildings are the most destroyed ones.
+#############################
+def count_standing(buildings_df: pd.DataFrame):
+    return [
+        bit_matrix(buildings_df[column].to_numpy(), len(names)).sum(axis=0).tolist()
+        for _, _, column, names in BUILDING_STATUSES
+    ]
+
+
+def duration_bucket_labels():
+    minutes = constants.DURATION_BUCKET_MINUTES
+    return (
+        [f"<{minutes[0]} min"]
+        + [f"{start}-{end} min" for start, end in zip(minutes, minutes[1:])]
+        + [f">={minutes[-1]} min"]
+    )
+
+
+def duration_buckets(durations):
+    edges = np.array(constants.DURATION_BUCKET_MINUTES) * 60
+    return np.array(duration_bucket_labels())[np.digitize(durations, edges)]
+
+
+#############################
+# Amount of destroyed buildings and matches, split by whether the team owning the building won the match
+# and by the duration of the match. The counts of different sets of matches can be summed together.
+#############################
+def destruction_counts(buildings_df: pd.DataFrame):
+    buckets = duration_buckets(buildings_df["duration"].to_numpy())
+    radiant_win = buildings_df["radiant_win"].to_numpy(dtype=bool)
+
+    tables = []
+    for team, kind, column, names in BUILDING_STATUSES:
+        destroyed = pd.DataFrame(
+            1 - bit_matrix(buildings_df[column].to_numpy(), len(names)), columns=names
+        )
+        destroyed["team_won"] = radiant_win if team == "radiant" else ~radiant_win
+        destroyed["duration_bucket"] = buckets
+
+        groups = destroyed.groupby(["team_won", "duration_bucket"])
+        counts = groups.sum().melt(
+            ignore_index=False, var_name="building", value_name="destroyed"
+        )
+        counts["matches"] = groups.size().reindex(counts.index)
+        counts["team"] = team
+        counts["kind"] = kind
+        tables.append(counts.reset_index())
+
+    return pd.concat(tables, ignore_index=True).set_index(DESTRUCTION_INDEX)[["destroyed", "matches"]]
+
+
+#############################
+# Destruction rate of each building per match outcome and duration. Returns a long table with a row
+# per building per group, ordered like the bitmasks and from the shortest matches to the longest.
+#############################
+def destruction_rates(counts: pd.DataFrame):
+    rates = counts.reset_index()
+    status_order = {(team, kind): i for i, (team, kind, _, _) in enumerate(BUILDING_STATUSES)}
+    building_order = {name: i for names in [BARRACKS, TOWERS] for i, name in enumerate(names)}
+    bucket_order = {label: i for i, label in enumerate(duration_bucket_labels())}
+    rates["order"] = [
+        (status_order[(team, kind)], building_order[building], team_won, bucket_order[bucket])
+        for team, kind, building, team_won, bucket in rates[DESTRUCTION_INDEX].itertuples(index=False)
+    ]
+    rates = rates.sort_values(by="order").drop(columns="order")
+
+    rates["destroyed_rate"] = (rates["destroyed"] / rates["matches"]).round(3)
+    return rates[
+        ["team", "kind", "building", "team_won", "duration_bucket", "matches", "destroyed", "destroyed_rate"]
+    ]
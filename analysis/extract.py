@@ -0,0 +1,136 @@
+import constants
+import json
+import numpy as np
+import pandas as pd
+
+# orjson decodes the huge match objects several times faster than the standard library
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Columns of the pick/ban table, so that it has them even if none of the matches has picks or bans
+PICKBAN_COLUMNS = ["match_id", "order", "team", "hero_id", "is_pick", "won"]
+
+BUILDING_KEYS = [
+    "barracks_status_dire",
+    "barracks_status_radiant",
+    "tower_status_dire",
+    "tower_status_radiant",
+]
+
+
+def decode(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+#############################
+# Collects the player performances straight into typed column arrays (see constants.PLAYER_DTYPES)
+# instead of a list of dicts. The arrays are preallocated for the expected amount of rows and grown
+# if needed; the missing values are tracked with masks so the integer columns can stay narrow.
+# The caller can choose which player keys to keep; by default the ones in constants.py.
+#############################
+class PlayerColumns:
+    def __init__(self, player_keys=None, capacity=1024):
+        self.keys = player_keys if player_keys is not None else constants.PLAYER_KEYS
+        self.size = 0
+        self.values = {}
+        self.missing = {}
+        for k in self.keys:
+            dtype = pd.api.types.pandas_dtype(constants.PLAYER_DTYPES.get(k, "object"))
+            # Categories and other non-numeric columns are collected as objects and converted at the end
+            numpy_dtype = getattr(dtype, "numpy_dtype", dtype)
+            if not isinstance(numpy_dtype, np.dtype):
+                numpy_dtype = np.dtype(object)
+            self.values[k] = np.zeros(max(capacity, 1), dtype=numpy_dtype)
+            self.missing[k] = np.ones(max(capacity, 1), dtype=bool)
+
+    def grow(self):
+        for k in self.keys:
+            self.values[k] = np.concatenate([self.values[k], np.zeros_like(self.values[k])])
+            self.missing[k] = np.concatenate([self.missing[k], np.ones_like(self.missing[k])])
+
+    def append(self, player):
+        if self.size == len(self.missing[self.keys[0]]):
+            self.grow()
+        i = self.size
+        # Look up only these keys instead of going through the hundreds of keys in each player
+        for k in self.keys:
+            value = player.get(k)
+            if value is not None:
+                self.values[k][i] = value
+                self.missing[k][i] = False
+        self.size += 1
+
+    def to_frame(self):
+        columns = {}
+        for k in self.keys:
+            values = self.values[k][: self.size]
+            missing = self.missing[k][: self.size]
+            dtype = constants.PLAYER_DTYPES.get(k, "object")
+            if dtype.startswith(("Int", "UInt")):
+                columns[k] = pd.arrays.IntegerArray(values, missing)
+            elif dtype == "boolean":
+                columns[k] = pd.arrays.BooleanArray(values, missing)
+            elif values.dtype.kind == "f":
+                columns[k] = np.where(missing, np.nan, values).astype(values.dtype)
+            else:
+                values = values.copy()
+                values[missing] = None
+                columns[k] = pd.Series(values, dtype=dtype)
+        return pd.DataFrame(columns)
+
+
+#############################
+# Sets the column types of a player DataFrame again, e.g. after concatenating parts whose categories differ.
+#############################
+def apply_player_dtypes(player_df: pd.DataFrame):
+    return player_df.astype(
+        {k: v for k, v in constants.PLAYER_DTYPES.items() if k in player_df.columns}
+    )
+
+
+#############################
+# Picks the parts of a match needed for the analysis out of the huge OpenDota object:
+# the players are added to the given PlayerColumns, and a row per pick/ban and a single row
+# with the building statuses are returned.
+# Hero names are not added here since they come from a separate API and may change.
+#############################
+def extract_match(match_json, player_columns):
+    # The keys which to keep from this huge object are defined in PlayerColumns
+    for player in match_json["players"]:
+        player_columns.append(player)
+
+    # Team 0 = radiant, 1 = dire. Store whether the picking/banning team won to spare the check later on.
+    radiant_win = match_json["radiant_win"]
+    pickban_rows = [
+        {
+            "match_id": match_json["match_id"],
+            "order": pickban["order"],
+            "team": pickban["team"],
+            "hero_id": pickban["hero_id"],
+            "is_pick": pickban["is_pick"],
+            "won": (radiant_win and pickban["team"] == 0) or (not radiant_win and pickban["team"] == 1),
+        }
+        for pickban in match_json.get("picks_bans") or []
+    ]
+
+    building_row = {
+        "match_id": match_json["match_id"],
+        "radiant_win": radiant_win,
+        "duration": match_json["duration"],
+    }
+    for k in BUILDING_KEYS:
+        building_row[k] = match_json[k]
+
+    return pickban_rows, building_row
+
+
+#############################
+# Decodes and extracts a match stored as raw JSON bytes. The decoded object is dropped as soon as
+# the rows are extracted, so only a single full match is held in memory at a time.
+#############################
+def extract_raw_match(raw, player_columns):
+    return extract_match(decode(raw), player_columns)
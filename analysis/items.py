@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+# The slots of the items a player ended the match with (see constants.PLAYER_KEYS)
+ITEM_SLOTS = [f"item_{i}" for i in range(6)] + [f"backpack_{i}" for i in range(4)] + ["item_neutral"]
+
+
+# The names are looked up from a dict of item IDs and names (see api_calls/game_constants.py)
+def item_names(item_ids, item_table):
+    return item_ids.map(item_table)
+
+
+#############################
+# Melts the item slots into a long table with a row per item of each player: match, account, hero,
+# whether the player won and the item. Empty slots (0) are dropped, and an item held in several slots
+# counts once. The slots are handled as a single NumPy matrix instead of DataFrame.melt, which would
+# copy every other column for each of the eleven slots.
+#############################
+def item_rows(player_df: pd.DataFrame):
+    slots = np.column_stack(
+        [player_df[c].astype("Int32").to_numpy(dtype=np.int32, na_value=0) for c in ITEM_SLOTS]
+    )
+    # With the slots of each player sorted, the duplicates of an item end up next to each other
+    slots.sort(axis=1)
+    keep = slots > 0
+    keep[:, 1:] &= slots[:, 1:] != slots[:, :-1]
+    players = np.nonzero(keep)[0]
+
+    won = (player_df["isRadiant"] == player_df["radiant_win"]).to_numpy(dtype=bool, na_value=False)
+    return pd.DataFrame(
+        {
+            "match_id": player_df["match_id"].array.take(players),
+            "account_id": player_df["account_id"].array.take(players),
+            "hero_id": player_df["hero_id"].astype("Int16").array.take(players),
+            "won": won[players],
+            "item_id": slots[keep],
+        }
+    )
+
+
+#############################
+# The counting functions below return tallies that can be summed together, like the ones in
+# picks_bans.py (see aggregate_state.py). The rest turn the tallies into the final tables.
+#############################
+def item_counts(df: pd.DataFrame):
+    return df.groupby("item_id")["won"].agg(games="size", wins="sum").astype(int)
+
+
+def hero_item_counts(df: pd.DataFrame):
+    return df.groupby(["hero_id", "item_id"])["won"].agg(games="size", wins="sum").astype(int)
+
+
+# Games played with each hero; the item usage rates are relative to these
+def hero_game_counts(player_df: pd.DataFrame):
+    return player_df["hero_id"].astype(int).value_counts().astype(int)
+
+
+#############################
+# Games, wins, usage rate (of all the players) and winrate of each item, the most used first.
+#############################
+def item_stats(counts: pd.DataFrame, hero_games, item_table):
+    stats = counts.sort_index().reset_index()
+    stats.insert(1, "item_name", item_names(stats["item_id"], item_table))
+    stats["usage_rate"] = (stats["games"] / hero_games.sum()).round(3)
+    stats["winrate"] = (stats["wins"] / stats["games"]).round(2)
+    return stats.sort_values("games", ascending=False, kind="stable").reset_index(drop=True)
+
+
+#############################
+# The k most used items of each hero with their usage rates (of the games with the hero) and winrates.
+#############################
+def hero_builds(counts: pd.DataFrame, hero_games, hero_table, item_table, k=6):
+    builds = (
+        counts.reset_index()
+        .sort_values(["hero_id", "games", "item_id"], ascending=[True, False, True], kind="stable")
+        .groupby("hero_id")
+        .head(k)
+        .reset_index(drop=True)
+    )
+    builds.insert(1, "hero_name", builds["hero_id"].astype(int).map(hero_table))
+    builds.insert(3, "item_name", item_names(builds["item_id"], item_table))
+    builds["usage_rate"] = (builds["games"] / builds["hero_id"].astype(int).map(hero_games)).round(2)
+    builds["winrate"] = (builds["wins"] / builds["games"]).round(2)
+    return builds
@@ -0,0 +1,166 @@
+import constants
+import importlib.util
+import metrics
+import os
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from analysis.extract import PICKBAN_COLUMNS, PlayerColumns, apply_player_dtypes, extract_raw_match
+from match_store import MatchStore
+
+# Each table is a directory of part files, one part written per update
+TABLES = ["players", "picks_bans", "buildings"]
+
+
+def season_directory(season=None):
+    if season is None:
+        season = constants.SEASON
+    return f"{constants.PARSE_CACHE_DIRECTORY}/season={season}"
+
+
+def extract_chunk(store, match_ids, player_keys=None):
+    # There are 10 players in a match
+    player_columns = PlayerColumns(player_keys, 10 * len(match_ids))
+    pickban_rows = []
+    building_rows = []
+    for match_id, raw in store.iter_raw(match_ids):
+        pickbans, buildings = extract_raw_match(raw, player_columns)
+        pickban_rows.extend(pickbans)
+        building_rows.append(buildings)
+
+    return player_columns.to_frame(), pd.DataFrame(pickban_rows, columns=PICKBAN_COLUMNS), pd.DataFrame(building_rows)
+
+
+# Each worker process opens the store once and keeps it here
+worker_store = None
+
+
+def init_worker(directory):
+    global worker_store
+    worker_store = MatchStore(directory)
+
+
+def extract_chunk_in_worker(match_ids, player_keys):
+    return extract_chunk(worker_store, match_ids, player_keys)
+
+
+def extract_chunks(store, match_ids, workers, player_keys):
+    # Several chunks per worker so that a slow chunk doesn't leave the other workers idle at the end
+    chunk_size = max(1, len(match_ids) // (workers * 4))
+    chunks = [match_ids[i : i + chunk_size] for i in range(0, len(match_ids), chunk_size)]
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(store.directory,)
+    ) as executor:
+        partial_tables = list(
+            executor.map(extract_chunk_in_worker, chunks, [player_keys] * len(chunks))
+        )
+
+    player_df, pickban_df, buildings_df = (
+        pd.concat([tables[i] for tables in partial_tables], ignore_index=True) for i in range(3)
+    )
+    return apply_player_dtypes(player_df), pickban_df, buildings_df
+
+
+#############################
+# Extracts the given matches from the store into three DataFrames: player performances (one row per
+# player per match), picks/bans (one row per pick or ban) and buildings (one row per match).
+# With several workers, the matches are split into chunks that are decoded and extracted in separate
+# processes. The partial tables are concatenated in the original order, so the result is the same.
+# The player keys default to the ones in constants.py.
+#############################
+@metrics.timed
+def extract_tables(store, match_ids, workers=1, player_keys=None):
+    if workers <= 1 or len(match_ids) < 2:
+        tables = extract_chunk(store, match_ids, player_keys)
+    else:
+        tables = extract_chunks(store, match_ids, workers, player_keys)
+    metrics.increment("extract_tables.matches", len(match_ids))
+    metrics.increment("extract_tables.player_rows", len(tables[0]))
+    metrics.increment("extract_tables.pickban_rows", len(tables[1]))
+    return tables
+
+
+#############################
+# A part counts as complete only if its buildings file exists, since that one is written last.
+# This way a crash in the middle of an update can't leave half of a part behind to be read.
+#############################
+def complete_parts(directory):
+    buildings_directory = f"{directory}/buildings"
+    if not os.path.isdir(buildings_directory):
+        return []
+    return sorted(f for f in os.listdir(buildings_directory) if f.endswith(".parquet"))
+
+
+def read_table(directory, table, columns=None):
+    # Read the parts one by one; the column types inferred for different parts might not match exactly
+    parts = [
+        pd.read_parquet(f"{directory}/{table}/{part}", columns=columns)
+        for part in complete_parts(directory)
+    ]
+    if len(parts) == 0:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(parts, ignore_index=True)
+
+
+def cached_match_ids(directory=None):
+    if directory is None:
+        directory = season_directory()
+    return set(read_table(directory, "buildings", ["match_id"])["match_id"].astype(str))
+
+
+#############################
+# Removes what a failed update left behind: the temporary files of the part, and the table
+# directories if they were created for it and are still empty.
+#############################
+def remove_incomplete_part(directory, part):
+    for table in TABLES:
+        if os.path.isfile(f"{directory}/{table}/{part}.tmp"):
+            os.remove(f"{directory}/{table}/{part}.tmp")
+        if os.path.isdir(f"{directory}/{table}") and len(os.listdir(f"{directory}/{table}")) == 0:
+            os.rmdir(f"{directory}/{table}")
+
+
+#############################
+# Extracts only the matches that are not in the cache yet and writes them as a new part of each table.
+# Returns the tables of the new matches, or None if there were none.
+# Raises ImportError if no Parquet engine (pyarrow) is installed, before extracting anything.
+#############################
+def update_cache(store, directory=None, workers=1):
+    if directory is None:
+        directory = season_directory()
+    if importlib.util.find_spec("pyarrow") is None:
+        raise ImportError("pyarrow is required for the parse cache")
+
+    cached = cached_match_ids(directory)
+    new_match_ids = [m for m in store.match_ids() if m not in cached]
+    print(f"{len(cached)} matches in the parse cache, extracting {len(new_match_ids)} new ones.")
+    if len(new_match_ids) == 0:
+        return None
+
+    tables = dict(zip(TABLES, extract_tables(store, new_match_ids, workers)))
+    part = f"part-{len(complete_parts(directory)):05d}.parquet"
+    try:
+        for table in TABLES:
+            if not os.path.isdir(f"{directory}/{table}"):
+                os.makedirs(f"{directory}/{table}")
+            tables[table].to_parquet(f"{directory}/{table}/{part}.tmp", index=False)
+    except BaseException:
+        remove_incomplete_part(directory, part)
+        raise
+    # Rename the buildings part last: that marks the whole part as complete
+    for table in TABLES:
+        os.replace(f"{directory}/{table}/{part}.tmp", f"{directory}/{table}/{part}")
+    return tables["players"], tables["picks_bans"], tables["buildings"]
+
+
+#############################
+# Loads the cached tables. Only the given columns of the player table are read, if any are given.
+#############################
+@metrics.timed
+def load_tables(directory=None, player_columns=None):
+    if directory is None:
+        directory = season_directory()
+    return (
+        apply_player_dtypes(read_table(directory, "players", player_columns)),
+        read_table(directory, "picks_bans"),
+        read_table(directory, "buildings"),
+    )
@@ -0,0 +1,124 @@
+import pandas as pd
+
+# Indicator columns added by prepare(); summing them gives the pick/ban tallies
+TALLY_COLUMNS = ["picked", "picked_win", "banned", "banned_win"]
+
+
+# The names are looked up from a dict of hero IDs and names (see api_calls/game_constants.py)
+def hero_names(hero_ids, hero_table):
+    return hero_ids.map(hero_table)
+
+
+#############################
+# Prepares the pick/ban table: adds indicator columns that can be summed and the draft phase of each row.
+# A new phase starts whenever a ban follows a pick, which holds for every version of captains mode.
+#############################
+def prepare(pickban_df: pd.DataFrame):
+    df = pickban_df.sort_values(["match_id", "order"], kind="stable").reset_index(drop=True)
+    is_pick = df["is_pick"].astype(bool)
+    won = df["won"].astype(bool)
+    df["picked"] = is_pick.astype(int)
+    df["picked_win"] = (is_pick & won).astype(int)
+    df["banned"] = (~is_pick).astype(int)
+    df["banned_win"] = (~is_pick & won).astype(int)
+
+    previous_is_pick = is_pick.groupby(df["match_id"]).shift(1, fill_value=False).astype(bool)
+    df["phase"] = (~is_pick & previous_is_pick).astype(int).groupby(df["match_id"]).cumsum() + 1
+    return df
+
+
+#############################
+# The counting functions below return tallies that can be summed together, so that the tallies of
+# new matches can be added to the earlier ones (see aggregate_state.py). The rest of the functions
+# turn the tallies into the final tables with hero names and rates.
+#############################
+def hero_counts(df: pd.DataFrame):
+    counts = df.groupby("hero_id")[TALLY_COLUMNS].sum()
+
+    # First pick of each match; its winning is already in the picked_win column
+    picks = df[df["picked"] == 1]
+    # A batch of new matches might not have any picks at all (e.g. all pick matches)
+    first_picks = picks.loc[picks.groupby("match_id")["order"].idxmin()] if len(picks) > 0 else picks
+    counts["first_picked"] = first_picks.groupby("hero_id").size()
+    counts["first_picked_win"] = first_picks.groupby("hero_id")["picked_win"].sum()
+    return counts.fillna(0).astype(int)
+
+
+def phase_counts(df: pd.DataFrame):
+    return df.groupby(["phase", "hero_id"])[TALLY_COLUMNS].sum()
+
+
+def pair_counts(df: pd.DataFrame):
+    picks = df.loc[df["picked"] == 1, ["match_id", "team", "hero_id", "picked_win"]]
+    if len(picks) == 0:
+        return pd.DataFrame(
+            {"games": [], "wins": []},
+            index=pd.MultiIndex.from_arrays([[], []], names=["hero_id_a", "hero_id_b"]),
+            dtype=int,
+        )
+    pairs = picks.merge(picks, on=["match_id", "team"], suffixes=("_a", "_b"))
+    pairs = pairs[pairs["hero_id_a"] < pairs["hero_id_b"]]
+    return pairs.groupby(["hero_id_a", "hero_id_b"]).agg(
+        games=("match_id", "size"), wins=("picked_win_a", "sum")
+    )
+
+
+#############################
+# Pick and ban counts and wins of each hero.
+#############################
+def hero_stats(counts: pd.DataFrame, hero_table):
+    stats = (
+        counts.sort_index()[TALLY_COLUMNS]
+        .reset_index()
+        .rename(
+            columns={
+                "picked": "picked_games",
+                "picked_win": "picked_wins",
+                "banned": "banned_games",
+                "banned_win": "banned_wins",
+            }
+        )
+    )
+    stats.insert(1, "hero_name", hero_names(stats["hero_id"], hero_table))
+    return stats
+
+
+#############################
+# How often each picked hero was the first pick of a match, relative to all the picks of the hero.
+#############################
+def first_pick_stats(counts: pd.DataFrame, hero_table):
+    stats = counts.loc[counts["picked"] > 0].sort_index()
+    stats = pd.DataFrame(
+        {
+            "picked_games": stats["picked"],
+            "first_picked_games": stats["first_picked"],
+            "first_picked_wins": stats["first_picked_win"],
+            "first_pick_rate": (stats["first_picked"] / stats["picked"]).round(2),
+        }
+    ).reset_index()
+    stats.insert(1, "hero_name", hero_names(stats["hero_id"], hero_table))
+    return stats
+
+
+#############################
+# Picks and bans of each hero per draft phase, with the share of all the matches and the winrates.
+#############################
+def phase_stats(counts: pd.DataFrame, matches, hero_table):
+    stats = counts.sort_index().reset_index()
+    stats["pick_rate"] = (stats["picked"] / matches).round(3)
+    stats["ban_rate"] = (stats["banned"] / matches).round(3)
+    stats["picked_winrate"] = (stats["picked_win"] / stats["picked"]).fillna(0.0).round(2)
+    stats["banned_winrate"] = (stats["banned_win"] / stats["banned"]).fillna(0.0).round(2)
+    stats.insert(2, "hero_name", hero_names(stats["hero_id"], hero_table))
+    return stats
+
+
+#############################
+# Pairs of heroes picked by the same team, with the amount of games and wins together.
+#############################
+def hero_pairs(counts: pd.DataFrame, hero_table):
+    stats = counts.sort_index().reset_index()
+    stats["winrate"] = (stats["wins"] / stats["games"]).round(2)
+    stats.insert(1, "hero_name_a", hero_names(stats["hero_id_a"], hero_table))
+    stats.insert(3, "hero_name_b", hero_names(stats["hero_id_b"], hero_table))
+    return stats.sort_values(by=["games", "wins"], ascending=False, kind="stable")
@@ -0,0 +1,234 @@
+import metrics
+import numpy as np
+import pandas as pd
+from analysis import parse_cache
+from analysis import picks_bans
+
+# Stats averaged over the games of a player or a hero
+AVERAGE_STATS = [
+    "kills",
+    "deaths",
+    "assists",
+    "last_hits",
+    "denies",
+    "gold_per_min",
+    "xp_per_min",
+    "hero_damage",
+    "hero_healing",
+    "tower_damage",
+]
+
+# Columns of a player history, newest match first
+HISTORY_COLUMNS = [
+    "match_id",
+    "hero_id",
+    "hero_name",
+    "isRadiant",
+    "won",
+    "duration",
+    "kills",
+    "deaths",
+    "assists",
+    "gold_per_min",
+    "xp_per_min",
+    "hero_damage",
+    "net_worth",
+    "level",
+]
+
+
+# Key columns as plain integers; missing keys (e.g. the account IDs of anonymous players) become -1
+def key_array(series: pd.Series):
+    return series.astype("Int64").to_numpy(dtype=np.int64, na_value=-1)
+
+
+# The rows of a match are next to each other, so their positions can be turned into a slice
+def slice_of(positions):
+    if len(positions) == 0:
+        return slice(0, 0)
+    return slice(positions[0], positions[-1] + 1)
+
+
+#############################
+# Sorted index of a key column. The positions of the rows are sorted by their keys once, so the rows
+# of a key (or of many keys at once) are found with a binary search instead of scanning the column.
+# The rows of a key stay in their original order.
+#############################
+class KeyIndex:
+    def __init__(self, keys):
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def positions(self, key):
+        start = self.keys.searchsorted(key, "left")
+        end = self.keys.searchsorted(key, "right")
+        return self.order[start:end]
+
+    # Positions of the rows of all the given keys, grouped by the keys in the given order,
+    # and the amount of rows of each key
+    def positions_of_many(self, keys):
+        starts = self.keys.searchsorted(keys, "left")
+        counts = self.keys.searchsorted(keys, "right") - starts
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return self.order[offsets], counts
+
+
+#############################
+# The parsed matches held in memory for answering repeated queries, e.g. from a dashboard or a bot.
+# The player rows are indexed by account, hero and match, and the pick/ban and building rows by
+# match (and hero), so a query only touches the rows it needs. The stats used by the summaries are
+# kept as NumPy arrays, and only the histories and single matches are returned as DataFrames.
+#############################
+class MatchDataset:
+    def __init__(self, player_df, pickban_df, buildings_df, hero_table=None):
+        # Sorted by match so that the rows of a match can be sliced out without copying each column
+        self.players = player_df.sort_values("match_id", kind="stable").reset_index(drop=True)
+        self.players["won"] = (self.players["isRadiant"] == self.players["radiant_win"]).fillna(False)
+        self.picks_bans = pickban_df.sort_values(["match_id", "order"], kind="stable").reset_index(drop=True)
+        self.buildings = buildings_df.sort_values("match_id", kind="stable").reset_index(drop=True)
+        self.hero_table = hero_table if hero_table is not None else {}
+
+        self.account_ids = key_array(self.players["account_id"])
+        self.hero_ids = key_array(self.players["hero_id"])
+        self.match_ids = key_array(self.players["match_id"])
+        self.is_radiant = self.players["isRadiant"].to_numpy(dtype=bool, na_value=False)
+        self.won = self.players["won"].to_numpy(dtype=bool)
+        self.stats = self.players[AVERAGE_STATS].to_numpy(dtype=float, na_value=np.nan)
+        self.personanames = self.players["personaname"].to_numpy(dtype=object)
+        # The columns of the histories; a DataFrame is built from these faster than taken from the whole table
+        history = self.players.reindex(columns=HISTORY_COLUMNS).assign(
+            hero_id=self.hero_ids,
+            hero_name=picks_bans.hero_names(pd.Series(self.hero_ids), self.hero_table),
+        )
+        self.history_columns = {c: history[c].array for c in HISTORY_COLUMNS}
+
+        self.by_account = KeyIndex(self.account_ids)
+        self.by_hero = KeyIndex(self.hero_ids)
+        self.by_match = KeyIndex(self.match_ids)
+        self.pickban_is_pick = self.picks_bans["is_pick"].to_numpy(dtype=bool)
+        self.pickban_won = self.picks_bans["won"].to_numpy(dtype=bool)
+        self.pickbans_by_hero = KeyIndex(key_array(self.picks_bans["hero_id"]))
+        self.pickbans_by_match = KeyIndex(key_array(self.picks_bans["match_id"]))
+        self.buildings_by_match = KeyIndex(key_array(self.buildings["match_id"]))
+
+    def hero_name(self, hero_id):
+        return self.hero_table.get(int(hero_id))
+
+    def averages(self, positions):
+        if len(positions) == 0:
+            return {c: None for c in AVERAGE_STATS}
+        return dict(zip(AVERAGE_STATS, np.nanmean(self.stats[positions], axis=0).tolist()))
+
+    # Games, wins and winrate of each of the given heroes, the most common first. Returned as plain
+    # records like the rest of the summaries, as building a DataFrame would take longer than counting.
+    def count_by_hero(self, hero_ids, won, k=None):
+        hero_ids = hero_ids.clip(0)
+        games = np.bincount(hero_ids, minlength=1)
+        wins = np.bincount(hero_ids, weights=won, minlength=1).astype(int)
+        heroes = np.flatnonzero(games)
+        heroes = heroes[np.argsort(-games[heroes], kind="stable")][:k]
+        return [
+            {
+                "hero_id": hero_id,
+                "hero_name": self.hero_name(hero_id),
+                "games": hero_games,
+                "wins": hero_wins,
+                "winrate": round(hero_wins / hero_games, 2),
+            }
+            for hero_id, hero_games, hero_wins in zip(
+                heroes.tolist(), games[heroes].tolist(), wins[heroes].tolist()
+            )
+        ]
+
+    #############################
+    # All the games of the account, newest first (the match IDs grow over time).
+    #############################
+    def player_history(self, account_id, limit=None):
+        positions = self.by_account.positions(account_id)
+        positions = positions[np.argsort(-self.match_ids[positions], kind="stable")][:limit]
+        return pd.DataFrame({c: values.take(positions) for c, values in self.history_columns.items()})
+
+    #############################
+    # Games, wins, average stats and the most played heroes of the account; None if it has no games.
+    #############################
+    def player_summary(self, account_id, k=5):
+        positions = self.by_account.positions(account_id)
+        if len(positions) == 0:
+            return None
+        games = len(positions)
+        wins = int(self.won[positions].sum())
+        # The name used in the newest game
+        newest = positions[np.argmax(self.match_ids[positions])]
+        return {
+            "account_id": account_id,
+            "personaname": self.personanames[newest],
+            "games": games,
+            "wins": wins,
+            "winrate": round(wins / games, 2),
+            "averages": self.averages(positions),
+            "heroes": self.count_by_hero(self.hero_ids[positions], self.won[positions], k),
+        }
+
+    #############################
+    # Games, wins, picks, bans and average stats of the hero.
+    #############################
+    def hero_summary(self, hero_id):
+        positions = self.by_hero.positions(hero_id)
+        pickbans = self.pickbans_by_hero.positions(hero_id)
+        is_pick = self.pickban_is_pick[pickbans]
+        won = self.pickban_won[pickbans]
+        games = len(positions)
+        wins = int(self.won[positions].sum())
+        return {
+            "hero_id": hero_id,
+            "hero_name": self.hero_name(hero_id),
+            "games": games,
+            "wins": wins,
+            "winrate": round(wins / games, 2) if games > 0 else None,
+            "picked": int(is_pick.sum()),
+            "picked_win": int((is_pick & won).sum()),
+            "banned": int((~is_pick).sum()),
+            "banned_win": int((~is_pick & won).sum()),
+            "averages": self.averages(positions),
+        }
+
+    #############################
+    # How the hero has done against each of the other heroes: the games they have played against each
+    # other and the wins of the hero in them, the most common opponents first. With against=False,
+    # the same for the heroes played on the same team.
+    #############################
+    def hero_matchups(self, hero_id, against=True):
+        positions = self.by_hero.positions(hero_id)
+        others, counts = self.by_match.positions_of_many(self.match_ids[positions])
+        # The side and the result of the hero repeated for each player of its matches
+        is_radiant = np.repeat(self.is_radiant[positions], counts)
+        won = np.repeat(self.won[positions], counts)
+        if against:
+            keep = self.is_radiant[others] != is_radiant
+        else:
+            keep = (self.is_radiant[others] == is_radiant) & (self.hero_ids[others] != hero_id)
+        return self.count_by_hero(self.hero_ids[others[keep]], won[keep])
+
+    #############################
+    # The players, picks/bans and building statuses of a single match; None if it is not in the dataset.
+    #############################
+    def match(self, match_id):
+        buildings = self.buildings_by_match.positions(match_id)
+        if len(buildings) == 0:
+            return None
+        players = self.by_match.positions(match_id)
+        pickbans = self.pickbans_by_match.positions(match_id)
+        return {
+            "players": self.players.iloc[slice_of(players)],
+            "picks_bans": self.picks_bans.iloc[slice_of(pickbans)],
+            "buildings": self.buildings.iloc[buildings[0]].to_dict(),
+        }
+
+
+#############################
+# Loads the matches of a season from the parse cache (see parse_cache.py) and indexes them.
+# Run parse_matches.py first so that the cache has all the downloaded matches.
+#############################
+@metrics.timed
+def load_dataset(directory=None, hero_table=None):
+    return MatchDataset(*parse_cache.load_tables(directory), hero_table)
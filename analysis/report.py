@@ -0,0 +1,157 @@
+import constants
+import json
+import numpy as np
+import pandas as pd
+
+PLAYER_RECORD_COLUMNS = ["hero_id", "account_id", "personaname", "match_id"]
+
+
+#############################
+# Positions of the k largest (or smallest) values of each column of a 2D array, best first.
+# np.partition finds the k-th best value of all the columns at once without sorting the whole array;
+# the rows better than it and the first rows equal to it are then sorted. Ties are always settled by
+# the order of the rows, and NaNs end up last.
+#############################
+def top_k_positions(values, k, largest=True):
+    k = min(k, values.shape[0])
+    if k == 0:
+        return np.empty((0, values.shape[1]), dtype=int)
+    keys = -values if largest else values
+    kth = np.partition(keys, k - 1, axis=0)[k - 1]
+    positions = np.empty((k, values.shape[1]), dtype=int)
+    for i in range(values.shape[1]):
+        column = keys[:, i]
+        if np.isnan(kth[i]):
+            better, equal = np.flatnonzero(~np.isnan(column)), np.flatnonzero(np.isnan(column))
+        else:
+            better, equal = np.flatnonzero(column < kth[i]), np.flatnonzero(column == kth[i])
+        candidates = np.sort(np.concatenate([better, equal[: k - len(better)]]))
+        positions[:, i] = candidates[np.argsort(column[candidates], kind="stable")]
+    return positions
+
+
+#############################
+# Top (or bottom) k rows for each of the given columns. Returns a dict of small DataFrames, each with
+# the given extra columns, preceded by the ranked column unless it is one of them.
+#############################
+def leaderboards(df: pd.DataFrame, columns, k, largest=True, extra_columns=None):
+    values = df[columns].to_numpy(dtype=float, na_value=np.nan)
+    positions = top_k_positions(values, k, largest)
+    boards = {}
+    for i, c in enumerate(columns):
+        extra = extra_columns[c] if isinstance(extra_columns, dict) else extra_columns or []
+        boards[c] = df.iloc[positions[:, i]][extra if c in extra else [c] + extra].reset_index(drop=True)
+    return boards
+
+
+#############################
+# Everything needed to report about the player performances: totals, the longest and shortest matches,
+# games per player, radiant/dire wins and the record candidates of each stat. The aggregates of two
+# sets of matches can be merged without the player rows (see aggregate_state.py).
+#############################
+def player_aggregates(player_df: pd.DataFrame, k=3):
+    matches = player_df[["duration", "match_id", "radiant_win"]].drop_duplicates(subset="match_id")
+    return {
+        "totals": {c: int(player_df[c].sum()) for c in constants.TOTAL_STATS},
+        "longest_matches": matches.nlargest(k, "duration")[["duration", "match_id"]].reset_index(drop=True),
+        "shortest_matches": matches.nsmallest(k, "duration")[["duration", "match_id"]].reset_index(drop=True),
+        "games": player_df["account_id"].value_counts().astype(int),
+        "radiant_win": matches["radiant_win"].value_counts().astype(int),
+        "records": leaderboards(player_df, constants.HIGHEST_STATS, k, True, PLAYER_RECORD_COLUMNS),
+    }
+
+
+def merge_player_aggregates(old, new, k=3):
+    return {
+        "totals": {c: old["totals"][c] + new["totals"][c] for c in old["totals"]},
+        "longest_matches": pd.concat(
+            [old["longest_matches"], new["longest_matches"]], ignore_index=True
+        ).nlargest(k, "duration").reset_index(drop=True),
+        "shortest_matches": pd.concat(
+            [old["shortest_matches"], new["shortest_matches"]], ignore_index=True
+        ).nsmallest(k, "duration").reset_index(drop=True),
+        "games": old["games"].add(new["games"], fill_value=0).astype(int),
+        "radiant_win": old["radiant_win"].add(new["radiant_win"], fill_value=0).astype(int),
+        # The older candidates come first, so ties are settled the same way as with all the rows at once
+        "records": {
+            c: leaderboards(
+                pd.concat([old["records"][c], new["records"][c]], ignore_index=True),
+                [c],
+                k,
+                True,
+                PLAYER_RECORD_COLUMNS,
+            )[c]
+            for c in old["records"]
+        },
+    }
+
+
+#############################
+# Everything reported about the player performances, with hero names added to the records.
+#############################
+def player_report(aggregates, hero_table, k=3):
+    records = {}
+    for c, board in aggregates["records"].items():
+        board = board.copy()
+        board.insert(2, "hero_name", board["hero_id"].astype(int).map(hero_table))
+        records[c] = board
+
+    # Ties are listed in the order of the account IDs
+    games = aggregates["games"].sort_index()
+    games.index.name = "account_id"
+    return {
+        "totals": aggregates["totals"],
+        "longest_matches": aggregates["longest_matches"],
+        "shortest_matches": aggregates["shortest_matches"],
+        "most_games": games.nlargest(k),
+        "radiant_win": aggregates["radiant_win"].sort_index().sort_values(ascending=False, kind="stable"),
+        "records": records,
+    }
+
+
+#############################
+# The heroes with the highest and lowest amount of games and winrates, for both picks and bans.
+#############################
+def pickban_report(pb_df: pd.DataFrame, k=5):
+    columns = ["picked_games", "picked_winrate", "banned_games", "banned_winrate"]
+    extra_columns = {
+        c: ["hero_id", "hero_name"]
+        + (["picked_games", "picked_winrate"] if "picked" in c else ["banned_games", "banned_winrate"])
+        for c in columns
+    }
+    return {
+        "highest": leaderboards(pb_df, columns, k, True, extra_columns),
+        "lowest": leaderboards(pb_df, columns, k, False, extra_columns),
+    }
+
+
+#############################
+# The most used items, and the items with the highest and lowest winrates among the ones used in
+# at least constants.ITEM_MIN_GAMES games.
+#############################
+def item_report(item_df: pd.DataFrame, k=5):
+    columns = ["item_id", "item_name", "games", "usage_rate", "winrate"]
+    common = item_df[item_df["games"] >= constants.ITEM_MIN_GAMES]
+    return {
+        "most_used": item_df.head(k)[columns],
+        "highest_winrate": leaderboards(common, ["winrate"], k, True, columns)["winrate"],
+        "lowest_winrate": leaderboards(common, ["winrate"], k, False, columns)["winrate"],
+    }
+
+
+# Turns the DataFrames, Series and NumPy values of a report into plain JSON types
+def to_json_types(value):
+    if isinstance(value, dict):
+        return {str(k): to_json_types(v) for k, v in value.items()}
+    if isinstance(value, pd.DataFrame):
+        return json.loads(value.to_json(orient="records"))
+    if isinstance(value, pd.Series):
+        return json.loads(value.to_json(orient="index"))
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def write_report(path, report):
+    with open(path, "w") as f:
+        json.dump(to_json_types(report), f, indent=4)
@@ -1,10 +1,15 @@
 import constants
+import itertools
+import json
+import metrics
 import os
 import requests
 import sys
-import time
-from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from urllib3.util import Retry
+from api_calls.manifest import NO_DOTA_ID, RESOLVED, open_manifest
+from api_calls.rate_limit import get_limiter, limited_request
+from api_calls.sessions import get_session
 
 
 def write_to_files(list_of_ids, list_of_outliers, filename):
@@ -17,56 +22,208 @@ def write_to_files(list_of_ids, list_of_outliers, filename):
         f.writelines(outs)
 
 
+#############################
+# The watermark is the newest start time of the listed matches, along with the IDs of the matches
+# started at that exact second (several matches can share it). Everything older has been listed already.
+#############################
+def load_watermark():
+    path = f"{constants.LOG_DIRECTORY}/watermark.json"
+    if not os.path.isfile(path):
+        return {"started_at": None, "match_ids": []}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_watermark(watermark):
+    path = f"{constants.LOG_DIRECTORY}/watermark.json"
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(watermark, f, indent=4)
+    os.replace(f"{path}.tmp", path)
+
+
+#############################
+# A match that was still ongoing can finish after the matches started later than it, which the
+# watermark already covers. Keep the watermark at its start time instead, so that the next sync lists
+# it once it has finished. The finished matches listed again after it are skipped thanks to the manifest.
+#############################
+def cap_watermark(watermark, oldest_unfinished):
+    if oldest_unfinished is None or (
+        watermark["started_at"] is not None and watermark["started_at"] < oldest_unfinished
+    ):
+        return watermark
+    return {"started_at": oldest_unfinished, "match_ids": []}
+
+
+def update_watermark(watermark, match):
+    match_id = str(match["match_id"])
+    if watermark["started_at"] is None or match["started_at"] > watermark["started_at"]:
+        watermark["started_at"] = match["started_at"]
+        watermark["match_ids"] = [match_id]
+    elif match["started_at"] == watermark["started_at"] and match_id not in watermark["match_ids"]:
+        watermark["match_ids"].append(match_id)
+
+
+def request_hub_page(s, limiter, offset, limit):
+    return limited_request(
+        s,
+        limiter,
+        method="GET",
+        url=f"{constants.FACEIT_DATA_API_URL}/hubs/{constants.HUB_ID}/matches",
+        params={"offset": offset, "limit": limit},
+        headers={"Authorization": f"Bearer {constants.APP_API_KEY}"},
+    )
+
+
+def fetch_hub_page(s, limiter, page, limit):
+    r = request_hub_page(s, limiter, page * limit, limit)
+    return r.status_code, r.json() if r.status_code == 200 else None
+
+
+#############################
+# Yields the hub pages one by one as (offset, status code, data) until the last page or an error.
+#############################
+def iter_hub_pages(s, limiter, limit):
+    offset = 0
+    while True:
+        print(offset)
+        r = request_hub_page(s, limiter, offset, limit)
+        if r.status_code != 200:
+            yield offset, r.status_code, None
+            return
+        data = r.json()
+        yield offset, r.status_code, data
+        if len(data["items"]) < limit:
+            return
+        offset = data["end"]
+
+
+#############################
+# Whether a page is at or past the end of the listing: it is the last page of the hub, it has a match
+# started before the stop, or it could not be fetched. Since the hub is listed from the newest match
+# to the oldest, every page after such a page is past the end as well.
+#############################
+def is_last_page(status_code, data, limit, is_past_stop):
+    if status_code != 200:
+        return True
+    started = [match["started_at"] for match in data["items"] if "started_at" in match]
+    return len(data["items"]) < limit or (len(started) > 0 and is_past_stop(min(started)))
+
+
+#############################
+# Yields the same pages as iter_hub_pages, but fetches them concurrently within the rate limit.
+# The last page needed is found first: page 0 is probed alone, and then pages 1, 2, 4, 8... (galloping)
+# until one is at the end of the listing, and the range between the last two probes is then narrowed down by probing
+# several evenly spaced pages at once. Once a probe is at the end, the probes queued after it are
+# cancelled. Finally the remaining pages before the last one are fetched all at once.
+#############################
+def iter_hub_pages_concurrently(s, limiter, limit, workers, is_past_stop):
+    pages = {}
+    # The last page known to be before the end, and the first page known to be at the end
+    before, last = -1, None
+
+    def probe(executor, page_numbers):
+        nonlocal before, last
+        futures = [(page, executor.submit(fetch_hub_page, s, limiter, page, limit)) for page in page_numbers]
+        for page, future in futures:
+            if last is not None and page > last:
+                future.cancel()
+                continue
+            pages[page] = future.result()
+            print(page * limit)
+            if is_last_page(*pages[page], limit, is_past_stop):
+                last = page
+            else:
+                before = page
+
+    gallop = itertools.chain([0], (2**i for i in itertools.count()))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Page 0 alone first: when syncing often, it is usually the last page needed as well
+        probe(executor, [next(gallop)])
+        while last is None:
+            probe(executor, [next(gallop) for _ in range(workers)])
+
+        while last - before > 1:
+            count = min(workers, last - before - 1)
+            step = (last - before) / (count + 1)
+            probe(executor, sorted({before + max(1, round(step * (i + 1))) for i in range(count)}))
+
+        probe(executor, [page for page in range(last) if page not in pages])
+
+    for page in range(last + 1):
+        yield page * limit, *pages[page]
+
+
 #############################
 # Gets all the matches in a given FACEIT hub.
+# With sync enabled, the hub is paged only until the matches listed by the previous runs are reached,
+# so that only the new matches are returned; useful for daily updates.
+# With more than one page worker, the pages are fetched concurrently (see iter_hub_pages_concurrently).
+# If an output queue is given, each ID is also passed there as soon as it is found (see pipeline.py).
 #############################
-def get_faceit_matches(cutoff):
+@metrics.timed
+def get_faceit_matches(cutoff, manifest=None, sync=False, output_queue=None, page_workers=1):
+    if manifest is None:
+        manifest = open_manifest()
+
     if not os.path.isdir(constants.LOG_DIRECTORY):
         os.makedirs(constants.LOG_DIRECTORY)
 
     # Prepare variables for the paginated API
-    offset = 0
     limit = 50
     faceit_match_ids = []
     outliers = []
     all_fetched = False
 
+    # The old watermark decides where syncing stops; the new one is saved only after a complete listing
+    # so that a failed run can't skip over the matches it never reached.
+    old_watermark = load_watermark()
+    new_watermark = {
+        "started_at": old_watermark["started_at"],
+        "match_ids": list(old_watermark["match_ids"]),
+    }
+    # Start time of the oldest match that was still ongoing; the watermark can't move past it
+    oldest_unfinished = None
+
+    # The hub is listed from the newest match to the oldest, and the listing stops at the first match
+    # started before this (or at the cutoff)
+    def is_past_stop(started_at):
+        if sync and old_watermark["started_at"] is not None and started_at < old_watermark["started_at"]:
+            return True
+        return cutoff is not None and started_at <= cutoff
+
     # The API might randomly give some temporary error; utilize Retry to solve it.
+    # Rate limiting (429) is handled by the limiter, which knows how long to wait.
     retry_strategy = Retry(
         total=5,
         backoff_factor=2,
-        status_forcelist=[429, 500, 503],
+        status_forcelist=[500, 503],
+        # Otherwise a 429 with Retry-After would be retried here without the limiter ever seeing it
+        respect_retry_after_header=False,
+    )
+    s = get_session("faceit_hub_matches", retry_strategy, max(10, page_workers))
+    limiter = get_limiter(
+        "faceit_hub_matches", constants.FACEIT_HUB_RATE_LIMIT, constants.FACEIT_HUB_MAX_RATE_LIMIT
     )
-    s = requests.Session()
-    s.mount("https://", HTTPAdapter(max_retries=retry_strategy))
-
-    while not all_fetched:
-        print(offset)
 
-        payload = {
-            "offset": offset,
-            "limit": limit,
-        }
-        r = s.request(
-            method="GET",
-            url=f"https://open.faceit.com/data/v4/hubs/{constants.HUB_ID}/matches",
-            params=payload,
-            headers={"Authorization": f"Bearer {constants.APP_API_KEY}"},
-        )
+    # Each page is a (offset, status code, data) triple; see the functions above
+    if page_workers > 1:
+        pages = iter_hub_pages_concurrently(s, limiter, limit, page_workers, is_past_stop)
+    else:
+        pages = iter_hub_pages(s, limiter, limit)
 
+    for offset, status_code, data in pages:
         # If the API still returned an error even after the retries (not supposed to happen),
         # write found IDs to a file and exit the program
-        if r.status_code != 200:
+        if status_code != 200:
             print(
-                f"The API returned an unexpected error code: {r.status_code} at offset {offset}."
+                f"The API returned an unexpected error code: {status_code} at offset {offset}."
                 f"The latest match ID was {faceit_match_ids[-1] if len(faceit_match_ids) > 0 else 'not found'}."
                 f"Writing the collected match IDs to a file and exiting the program."
             )
             write_to_files(faceit_match_ids, outliers, "faceit_match_ids")
-            s.close()
+            manifest.mark_listed(faceit_match_ids)
             sys.exit(1)
 
-        data = r.json()
         for match in data["items"]:
             # All matches SHOULD be either finished or cancelled, check out for weird outliers
             if (
@@ -74,20 +231,41 @@ def get_faceit_matches(cutoff):
                 and match["status"].lower() != "cancelled"
             ):
                 outliers.append(f"{match['match_id']} {match['status']}")
+                if "started_at" in match and (
+                    oldest_unfinished is None or match["started_at"] < oldest_unfinished
+                ):
+                    oldest_unfinished = match["started_at"]
 
             elif "started_at" in match and match["status"].lower() == "finished":
+                if sync and old_watermark["started_at"] is not None:
+                    # Reached the matches that are older than the ones listed by the previous run
+                    if match["started_at"] < old_watermark["started_at"]:
+                        all_fetched = True
+                        break
+                    # Started at the same second as the newest known match, but might still be new
+                    elif (
+                        match["started_at"] == old_watermark["started_at"]
+                        and str(match["match_id"]) in old_watermark["match_ids"]
+                    ):
+                        continue
+
                 if cutoff is None or match["started_at"] > cutoff:
                     faceit_match_ids.append(str(match["match_id"]))
+                    update_watermark(new_watermark, match)
+                    if output_queue is not None:
+                        output_queue.put(faceit_match_ids[-1])
                 else:
                     all_fetched = True
                     break  # stop the unnecessary looping of the returned data
 
-        offset = data["end"]
-        if len(data["items"]) < limit:
-            all_fetched = True
-        time.sleep(1.0)  # abide by rate limits
-    s.close()
+        if all_fetched:
+            break
+    print(limiter.summary())
+    metrics.increment("get_faceit_matches.listed", len(faceit_match_ids))
+    metrics.increment("get_faceit_matches.outliers", len(outliers))
     write_to_files(faceit_match_ids, outliers, "faceit_match_ids")
+    manifest.mark_listed(faceit_match_ids)
+    save_watermark(cap_watermark(new_watermark, oldest_unfinished))
 
     print("get_faceit_matches ran successfully.")
     return faceit_match_ids
@@ -95,24 +273,33 @@ def get_faceit_matches(cutoff):
 
 #############################
 # Turns FACEIT match IDs into Dota in-game match IDs by querying a different API.
+# The IDs can also be given as an iterator, and the results passed on to an output queue (see pipeline.py).
 #############################
-def get_ingame_ids(faceit_match_ids):
+@metrics.timed
+def get_ingame_ids(faceit_match_ids, manifest=None, output_queue=None):
     # All these steps in get_matches can be ran one at a time, but if done so,
     # get the match IDs from a file instead (as they can't then be provided as parameters).
-    if faceit_match_ids is None or len(faceit_match_ids) == 0:
+    if not faceit_match_ids:
         with open(f"{constants.LOG_DIRECTORY}/faceit_match_ids.txt", "r") as file:
             faceit_match_ids = [line.rstrip() for line in file]
 
+    if manifest is None:
+        manifest = open_manifest()
+
     # The API might randomly give some temporary error; utilize Retry to solve it.
     # Queried info is not available in the external API. This part of the API is internal,
     # not documented, and subject to change; thus, retry with any status code that is at least 400.
+    # The exception is rate limiting (429), which is handled by the limiter that abides by the strict limits.
     retry_strategy = Retry(
         total=5,
         backoff_factor=2,
-        status_forcelist=[x for x in requests.status_codes._codes if x >= 400],
+        status_forcelist=[x for x in requests.status_codes._codes if x >= 400 and x != 429],
+        respect_retry_after_header=False,
+    )
+    s = get_session("faceit_match_details", retry_strategy)
+    limiter = get_limiter(
+        "faceit_match_details", constants.FACEIT_MATCH_RATE_LIMIT, constants.FACEIT_MATCH_MAX_RATE_LIMIT
     )
-    s = requests.Session()
-    s.mount("https://", HTTPAdapter(max_retries=retry_strategy))
 
     dota_match_ids = []
     outliers = []
@@ -120,9 +307,24 @@ def get_ingame_ids(faceit_match_ids):
         if i % 10 == 0:
             print(i)  # lazy progress bar
 
-        r = s.request(
+        # Matches resolved by an earlier (possibly interrupted) run don't need to be queried again
+        status = manifest.faceit_status(match)
+        if status == RESOLVED:
+            dota_match_ids.append(manifest.dota_match_id(match))
+            if output_queue is not None:
+                output_queue.put(dota_match_ids[-1])
+            metrics.increment("get_ingame_ids.skipped")
+            continue
+        elif status == NO_DOTA_ID:
+            outliers.append(match)
+            metrics.increment("get_ingame_ids.skipped")
+            continue
+
+        r = limited_request(
+            s,
+            limiter,
             method="GET",
-            url=f"https://api.faceit.com/match/v2/match/{match}",
+            url=f"{constants.FACEIT_INTERNAL_API_URL}/match/v2/match/{match}",
             headers={"Authorization": f"Bearer {constants.PERSONAL_API_KEY}"},
         )
 
@@ -134,21 +336,26 @@ def get_ingame_ids(faceit_match_ids):
                 f"The latest queried match ID was {match}."
                 f"Writing the collected Dota match IDs to a file and exiting the program."
             )
-            write_to_files(faceit_match_ids, outliers, "dota_match_ids")
-            s.close()
+            write_to_files(dota_match_ids, outliers, "dota_match_ids")
+            manifest.save()
             sys.exit(1)
 
         data = r.json()
         data = data["payload"]
         if "clientCustom" in data and "dota_match_id" in data["clientCustom"]:
             dota_match_ids.append(str(data["clientCustom"]["dota_match_id"]))
+            manifest.mark_resolved(match, dota_match_ids[-1])
+            metrics.increment("get_ingame_ids.resolved")
+            if output_queue is not None:
+                output_queue.put(dota_match_ids[-1])
         else:
             # Check out for outliers (should be empty)
             outliers.append(match)
-
-        time.sleep(3.0)  # abide by strict rate limits to this internal API
-    s.close()
-    write_to_files(faceit_match_ids, outliers, "dota_match_ids")
+            manifest.mark_no_dota_id(match)
+            metrics.increment("get_ingame_ids.no_dota_id")
+    print(limiter.summary())
+    write_to_files(dota_match_ids, outliers, "dota_match_ids")
+    manifest.save()
 
     print("get_ingame_ids ran successfully.")
     return dota_match_ids
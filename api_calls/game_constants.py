@@ -0,0 +1,87 @@
+import constants
+import json
+import os
+import requests
+import sys
+import time
+
+# The constants are only loaded once per run, and not at all if nothing asks for them
+loaded = {}
+
+
+def constants_path(resource):
+    return f"{constants.GAME_CONSTANTS_DIRECTORY}/{resource}.json"
+
+
+def is_fresh(path):
+    age = time.time() - os.path.getmtime(path)
+    return age < constants.GAME_CONSTANTS_MAX_AGE_HOURS * 3600
+
+
+def fetch_constants(resource):
+    try:
+        r = requests.get(f"{constants.OPENDOTA_API_URL}/constants/{resource}", timeout=30)
+    except requests.exceptions.RequestException as e:
+        print(f"Could not fetch {resource} constants: {e}")
+        return None
+    if r.status_code != 200:
+        print(f"Could not fetch {resource} constants due to unknown error {r.status_code}.")
+        return None
+    # A 200 response might still not be the constants, e.g. a page of a proxy or a truncated body
+    try:
+        return r.json()
+    except ValueError:
+        print(f"Could not fetch {resource} constants: the response was not valid JSON.")
+        return None
+
+
+def save_constants(path, data):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(f"{path}.tmp", path)
+
+
+#############################
+# Returns the given OpenDota constants (e.g. "heroes" or "items"). A cached copy is used while it is
+# fresh enough; otherwise the constants are fetched again, and if that fails, the old copy is used
+# instead so that the matches can be parsed offline as well. With refresh, the cached copy is refetched
+# regardless of its age.
+#############################
+def load_constants(resource, refresh=False):
+    if resource in loaded and not refresh:
+        return loaded[resource]
+
+    path = constants_path(resource)
+    cached = os.path.isfile(path)
+    data = None
+    if refresh or not cached or not is_fresh(path):
+        data = fetch_constants(resource)
+        if data is not None:
+            save_constants(path, data)
+        elif cached:
+            print(f"Using the cached {resource} constants instead.")
+        else:
+            print("Try running this script again.")
+            sys.exit(1)
+    if data is None:
+        with open(path, "r") as f:
+            data = json.load(f)
+
+    loaded[resource] = data
+    return data
+
+
+#############################
+# Hero and item names by their integer IDs. The full constants have a lot of other data per hero/item
+# and are keyed by strings, so these small tables are what the analysis uses to look the names up.
+#############################
+def hero_names(refresh=False):
+    return {int(hero_id): hero["localized_name"] for hero_id, hero in load_constants("heroes", refresh).items()}
+
+
+def item_names(refresh=False):
+    # The item constants are keyed by the internal names; not all of them have a display name
+    return {item["id"]: item.get("dname", key) for key, item in load_constants("items", refresh).items()}
@@ -0,0 +1,97 @@
+import constants
+import json
+import os
+import threading
+
+# Statuses recorded for each ID. FACEIT match IDs go through LISTED -> RESOLVED (or NO_DOTA_ID),
+# and Dota match IDs end up either DOWNLOADED or NOT_FOUND.
+LISTED = "listed"
+RESOLVED = "resolved"
+NO_DOTA_ID = "no_dota_id"
+DOWNLOADED = "downloaded"
+NOT_FOUND = "404"
+
+
+#############################
+# Persistent on-disk record of what each stage of get_matches has already done, so that
+# a crashed or interrupted run can be continued without fetching everything again.
+# The file is rewritten atomically every `save_every` updates and whenever save() is called.
+#############################
+class Manifest:
+    def __init__(self, path, save_every=10):
+        self.path = path
+        self.save_every = save_every
+        self.unsaved = 0
+        self.lock = threading.Lock()
+        self.faceit = {}
+        self.opendota = {}
+
+        if os.path.isfile(path):
+            with open(path, "r") as f:
+                data = json.load(f)
+            self.faceit = data["faceit"]
+            self.opendota = data["opendota"]
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # Write to a temporary file first so that a crash mid-write can't corrupt the manifest
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump({"faceit": self.faceit, "opendota": self.opendota}, f)
+        os.replace(f"{self.path}.tmp", self.path)
+        self.unsaved = 0
+
+    def _updated(self):
+        self.unsaved += 1
+        if self.unsaved >= self.save_every:
+            self._save()
+
+    def mark_listed(self, faceit_match_ids):
+        with self.lock:
+            for match in faceit_match_ids:
+                # Don't forget the Dota match ID of an already resolved match
+                if match not in self.faceit:
+                    self.faceit[match] = {"status": LISTED}
+            self._save()
+
+    def mark_resolved(self, faceit_match_id, dota_match_id):
+        with self.lock:
+            self.faceit[faceit_match_id] = {"status": RESOLVED, "dota_match_id": dota_match_id}
+            self._updated()
+
+    def mark_no_dota_id(self, faceit_match_id):
+        with self.lock:
+            self.faceit[faceit_match_id] = {"status": NO_DOTA_ID}
+            self._updated()
+
+    def faceit_status(self, faceit_match_id):
+        return self.faceit.get(faceit_match_id, {}).get("status")
+
+    def dota_match_id(self, faceit_match_id):
+        return self.faceit.get(faceit_match_id, {}).get("dota_match_id")
+
+    def mark_downloaded(self, dota_match_id):
+        with self.lock:
+            self.opendota[dota_match_id] = DOWNLOADED
+            self._updated()
+
+    def mark_not_found(self, dota_match_id):
+        with self.lock:
+            self.opendota[dota_match_id] = NOT_FOUND
+            self._updated()
+
+    def opendota_status(self, dota_match_id):
+        return self.opendota.get(dota_match_id)
+
+
+#############################
+# The manifest of the current season lives next to the other logs.
+#############################
+def open_manifest():
+    return Manifest(f"{constants.LOG_DIRECTORY}/manifest.json")
@@ -1,54 +1,119 @@
 import constants
 import json
-import os
-import requests
-import time
-from requests.adapters import HTTPAdapter
+import metrics
+from match_store import open_match_store
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from api_calls.manifest import DOWNLOADED, NOT_FOUND, open_manifest
+from api_calls.rate_limit import get_limiter, limited_request
+from api_calls.sessions import get_session
 
 
 #############################
-# Downloads the available match infos as JSONs from OpenDota API.
+# Downloads a single match from OpenDota API and saves it to the match store if it was found.
+# Returns the status code so that the caller can sort the match into the correct output.
+# Safe to call from several threads at once as long as they share the same limiter.
 #############################
-def get_matches_from_opendota(dota_match_ids):
+def download_match(s, limiter, store, match_id):
+    # Not all the matches are available, and the API returns 404 for unavailable ones.
+    r = limited_request(
+        s,
+        limiter,
+        method="GET",
+        url=f"{constants.OPENDOTA_API_URL}/matches/{match_id}",
+    )
+    if r.status_code == 200:
+        # Save match data for parsing later on. The response is stored as is; no need to decode it here.
+        store.put(match_id, r.content)
+    return r.status_code
+
+
+#############################
+# Sorts the result of a single download into the correct output.
+#############################
+def handle_status_code(match_id, status_code, manifest, rejected, outliers):
+    if status_code == 200:
+        manifest.mark_downloaded(match_id)
+        metrics.increment("get_matches_from_opendota.downloaded")
+    elif status_code == 404:
+        rejected.append(str(match_id) + "\n")
+        manifest.mark_not_found(match_id)
+        metrics.increment("get_matches_from_opendota.not_found")
+    # The API should only return 200 or 404
+    else:
+        print(
+            f"The API returned an unexpected status code {status_code}"
+            f"for match ID {match_id}."
+        )
+        outliers.append({match_id: status_code})
+        metrics.increment("get_matches_from_opendota.outliers")
+
+
+#############################
+# Downloads the available match infos as JSONs from OpenDota API into the compressed match store.
+# The IDs can also be given as an iterator that yields them while they are being fetched by the previous stage.
+#############################
+@metrics.timed
+def get_matches_from_opendota(dota_match_ids, workers=None, manifest=None):
     # All these steps in get_matches can be ran one at a time, but if done so,
     # get the match IDs from a file instead (as they can't then be provided as parameters).
-    if dota_match_ids is None or len(dota_match_ids) == 0:
+    if not dota_match_ids:
         with open(f"{constants.LOG_DIRECTORY}/dota_match_ids.txt", "r") as file:
             dota_match_ids = [line.rstrip() for line in file]
 
-    if not os.path.isdir(constants.MATCH_DIRECTORY):
-        os.makedirs(constants.MATCH_DIRECTORY)
+    store = open_match_store()
+
+    if workers is None:
+        workers = constants.OPENDOTA_WORKERS
+    if manifest is None:
+        manifest = open_manifest()
 
     outliers = []
     rejected = []
-    s = requests.Session()
-    s.mount("https://", HTTPAdapter())
+    skipped = 0
+    limiter = get_limiter(
+        "opendota_matches",
+        constants.OPENDOTA_RATE_LIMIT,
+        constants.OPENDOTA_MAX_RATE_LIMIT,
+        constants.OPENDOTA_BURST,
+    )
+    s = get_session("opendota_matches", pool_maxsize=workers)
 
-    for i, match_id in enumerate(dota_match_ids):
-        if i % 10 == 0:
-            print(i)
+    # Keep up to `workers` requests in flight; the shared limiter keeps the total rate in check.
+    # The results are handled in the original order (oldest first), so the outputs stay deterministic,
+    # and only a limited amount of downloads is queued at a time.
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i, match_id in enumerate(dota_match_ids):
+            if i % 10 == 0:
+                print(i)
 
-        # Not all the matches are available, and the API returns 404 for unavailable ones.
-        r = s.request(
-            method="GET",
-            url=f"https://api.opendota.com/api/matches/{match_id}",
-        )
-        if r.status_code != 200:
-            if r.status_code == 404:
+            # Skip the matches that an earlier run already downloaded or found to be unavailable
+            status = manifest.opendota_status(match_id)
+            if status == NOT_FOUND:
                 rejected.append(str(match_id) + "\n")
-            # The API should only return 200 or 404
-            else:
-                print(
-                    f"The API returned an unexpected status code {r.status_code}"
-                    f"for match ID {match_id}."
-                )
-                outliers.append({match_id: r.status_code})
-        else:
-            # Save match data to json for parsing later on
-            data = r.json()
-            with open(f"{constants.MATCH_DIRECTORY}/{match_id}.json", "w") as f:
-                json.dump(data, f, indent=4)
-        time.sleep(1.0)  # abide by rate limits
+                skipped += 1
+                continue
+            elif status == DOWNLOADED:
+                skipped += 1
+                continue
+            elif store.contains(match_id):
+                manifest.mark_downloaded(match_id)
+                skipped += 1
+                continue
+
+            in_flight.append((match_id, executor.submit(download_match, s, limiter, store, match_id)))
+            if len(in_flight) >= 2 * workers:
+                match_id, future = in_flight.popleft()
+                handle_status_code(match_id, future.result(), manifest, rejected, outliers)
+
+        while len(in_flight) > 0:
+            match_id, future = in_flight.popleft()
+            handle_status_code(match_id, future.result(), manifest, rejected, outliers)
+    print(f"Skipped {skipped} already processed matches.")
+    metrics.increment("get_matches_from_opendota.skipped", skipped)
+    print(limiter.summary())
+    manifest.save()
 
     # Save also matches that were not found and outliers (where API returned unexpected status code)
     with open(f"{constants.LOG_DIRECTORY}/opendota_404.txt", "w") as f:
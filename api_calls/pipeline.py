@@ -0,0 +1,86 @@
+import constants
+import queue
+import sys
+import threading
+from api_calls import faceit
+from api_calls import opendota
+
+# Put on a queue by the wrapper of a stage after the stage has finished (or failed)
+END_OF_STAGE = None
+
+
+#############################
+# Yields the IDs put on a queue until the previous stage signals it has finished.
+#############################
+def iter_queue(q):
+    while True:
+        item = q.get()
+        if item is END_OF_STAGE:
+            return
+        yield item
+
+
+#############################
+# Runs a single stage in its own thread. The stages exit the program on unrecoverable errors,
+# which in a thread only ends that thread, so catch it and let the main thread exit instead.
+#############################
+def run_stage(name, stage, input_queue, output_queue, failures):
+    try:
+        stage()
+    except BaseException as e:
+        print(f"Stage {name} failed: {e!r}")
+        failures.append(name)
+        if output_queue is not None:
+            output_queue.put(END_OF_STAGE)
+        # Keep consuming the input so that the previous stage doesn't block on a full queue forever
+        if input_queue is not None:
+            for _ in iter_queue(input_queue):
+                pass
+        return
+
+    if output_queue is not None:
+        output_queue.put(END_OF_STAGE)
+
+
+#############################
+# Runs the three stages of get_matches at the same time: each ID is passed to the next stage through
+# a bounded queue as soon as it is found. Every stage still abides by its own rate limits, so the
+# total runtime is close to that of the slowest stage instead of the sum of all three.
+#############################
+def run_pipeline(cutoff, manifest, sync=False, workers=None, hub_workers=1):
+    faceit_match_ids = queue.Queue(maxsize=constants.PIPELINE_QUEUE_SIZE)
+    dota_match_ids = queue.Queue(maxsize=constants.PIPELINE_QUEUE_SIZE)
+    failures = []
+
+    stages = [
+        (
+            "get_faceit_matches",
+            lambda: faceit.get_faceit_matches(cutoff, manifest, sync, faceit_match_ids, hub_workers),
+            None,
+            faceit_match_ids,
+        ),
+        (
+            "get_ingame_ids",
+            lambda: faceit.get_ingame_ids(iter_queue(faceit_match_ids), manifest, dota_match_ids),
+            faceit_match_ids,
+            dota_match_ids,
+        ),
+        (
+            "get_matches_from_opendota",
+            lambda: opendota.get_matches_from_opendota(iter_queue(dota_match_ids), workers, manifest),
+            dota_match_ids,
+            None,
+        ),
+    ]
+    threads = [
+        threading.Thread(target=run_stage, args=(*stage, failures), daemon=True)
+        for stage in stages
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if len(failures) > 0:
+        print(f"The pipeline did not finish; failed stages: {', '.join(failures)}.")
+        sys.exit(1)
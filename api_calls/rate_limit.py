@@ -0,0 +1,192 @@
+import metrics
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Rate limit headers differ between the APIs; the first one found is used
+REMAINING_HEADERS = [
+    "X-Rate-Limit-Remaining-Minute",  # OpenDota
+    "X-RateLimit-Remaining",
+    "RateLimit-Remaining",
+]
+RESET_HEADERS = [
+    "X-RateLimit-Reset",
+    "RateLimit-Reset",
+]
+
+# How many times a request is repeated after being answered with 429 before giving up
+RETRIES_ON_429 = 5
+
+
+#############################
+# Token bucket that can be shared between threads. Tokens are refilled continuously at `rate`
+# per second up to `capacity` (the allowed burst); each request takes one token, waiting if needed.
+#############################
+class TokenBucket:
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            # Sleep outside the lock so other threads can check the bucket meanwhile
+            time.sleep(wait)
+
+
+#############################
+# Token bucket that adjusts its rate based on the responses. The rate limit headers tell how much
+# of the budget is left, and the rate is set to spend it evenly until the window resets; without them
+# the rate creeps up after each success. On 429 the rate is halved and all requests wait for Retry-After.
+# Also keeps count of the requests so that the achieved rate can be reported per endpoint.
+#############################
+class AdaptiveRateLimiter(TokenBucket):
+    def __init__(self, name, rate, max_rate, capacity=1):
+        super().__init__(rate, capacity)
+        self.name = name
+        self.min_rate = rate / 10
+        self.max_rate = max_rate
+        self.paused_until = 0.0
+        self.requests = 0
+        self.rate_limited = 0
+        self.first_request = None
+        self.last_request = None
+
+    def acquire(self):
+        # Wait out a Retry-After before queueing for the tokens
+        while True:
+            wait = self.paused_until - time.monotonic()
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        super().acquire()
+
+    def update(self, response):
+        with self.lock:
+            now = time.monotonic()
+            self.requests += 1
+            if self.first_request is None:
+                self.first_request = now
+            self.last_request = now
+
+            if response.status_code == 429:
+                self.rate_limited += 1
+                self.rate = max(self.min_rate, self.rate / 2)
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                # Without the header, wait for as long as a single request takes at the new rate
+                self.paused_until = now + (retry_after if retry_after is not None else 1 / self.rate)
+                self.tokens = 0
+                return
+
+            remaining = first_header(response.headers, REMAINING_HEADERS)
+            if remaining is not None:
+                reset = parse_reset(first_header(response.headers, RESET_HEADERS))
+                if remaining <= 0:
+                    self.paused_until = now + reset
+                else:
+                    self.rate = min(self.max_rate, max(self.min_rate, remaining / reset))
+            else:
+                # No information available; speed up a little and rely on 429s to tell when to stop
+                self.rate = min(self.max_rate, self.rate * 1.05)
+
+    def requests_per_second(self):
+        if self.requests < 2 or self.last_request == self.first_request:
+            return 0.0
+        return (self.requests - 1) / (self.last_request - self.first_request)
+
+    def summary(self):
+        return (
+            f"{self.name}: {self.requests} requests, {self.rate_limited} rate limited, "
+            f"{self.requests_per_second():.2f} requests/s on average, current rate {self.rate:.2f}/s."
+        )
+
+
+def first_header(headers, names):
+    for name in names:
+        if name in headers:
+            try:
+                return float(headers[name])
+            except ValueError:
+                return None
+    return None
+
+
+#############################
+# Retry-After is either the amount of seconds to wait or an HTTP date.
+#############################
+def parse_retry_after(value):
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+#############################
+# The reset header is either the amount of seconds left in the window or the UNIX time the window ends.
+# Assume a window of one minute if it is not given (OpenDota only tells the remaining requests per minute).
+#############################
+def parse_reset(value):
+    if value is None:
+        return 60.0
+    if value > 1_000_000_000:
+        value -= time.time()
+    return max(1.0, value)
+
+
+# The limiters are shared by everything that calls the same endpoint, e.g. the stages of the pipeline
+limiters = {}
+limiters_lock = threading.Lock()
+
+
+def get_limiter(name, rate, max_rate, capacity=1):
+    with limiters_lock:
+        if name not in limiters:
+            limiters[name] = AdaptiveRateLimiter(name, rate, max_rate, capacity)
+        return limiters[name]
+
+
+#############################
+# Sends a request once the limiter allows it, and repeats it after waiting if the API answered with 429.
+# Other errors are left for the Retry strategy mounted on the session. The latency, status codes, retries
+# and size of the responses are recorded in the metrics under the name of the limiter.
+#############################
+def limited_request(s, limiter, **kwargs):
+    for _ in range(RETRIES_ON_429 + 1):
+        limiter.acquire()
+        start = time.perf_counter()
+        r = s.request(**kwargs)
+        record_response(limiter.name, r, time.perf_counter() - start)
+        limiter.update(r)
+        if r.status_code != 429:
+            break
+    return r
+
+
+def record_response(name, r, seconds):
+    metrics.observe(f"{name}.latency", seconds)
+    metrics.increment(f"{name}.requests")
+    metrics.increment(f"{name}.status_{r.status_code}")
+    metrics.increment(f"{name}.bytes", len(r.content))
+    # The retries done by the Retry strategy of the session are only visible in the urllib3 response
+    retries = getattr(getattr(r.raw, "retries", None), "history", None)
+    if retries:
+        metrics.increment(f"{name}.retries", len(retries))
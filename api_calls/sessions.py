@@ -0,0 +1,30 @@
+import requests
+import threading
+from requests.adapters import HTTPAdapter
+
+# Like the limiters, the sessions are shared by everything that calls the same API during a run,
+# e.g. the stages of the pipeline or the targets of a batch, so that their pooled connections are reused.
+sessions = {}
+sessions_lock = threading.Lock()
+
+
+#############################
+# Returns the session with the given name, creating it on the first call. The adapter is mounted for
+# plain HTTP as well, for a local mock server. Close the sessions with close_sessions() at the end.
+#############################
+def get_session(name, max_retries=0, pool_maxsize=10):
+    with sessions_lock:
+        if name not in sessions:
+            s = requests.Session()
+            adapter = HTTPAdapter(max_retries=max_retries, pool_maxsize=pool_maxsize)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            sessions[name] = s
+        return sessions[name]
+
+
+def close_sessions():
+    with sessions_lock:
+        for s in sessions.values():
+            s.close()
+        sessions.clear()
@@ -0,0 +1,169 @@
+import argparse
+import constants
+import json
+import metrics
+import os
+import parse_matches
+import sys
+from datetime import datetime
+from analysis import aggregate_state
+from api_calls import faceit
+from api_calls import game_constants
+from api_calls import opendota
+from api_calls.manifest import open_manifest
+from api_calls.sessions import close_sessions
+from match_store import open_match_store
+
+
+#############################
+# Reads the targets from a JSON file: a list of {"hub_id": ..., "season": ...} objects, each optionally
+# with a "cutoff" date (YYYY/MM/DD) and "sync": true, which work like the arguments of get_matches.py.
+#############################
+def load_targets(path):
+    try:
+        with open(path, "r") as f:
+            targets = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not read the targets from {path}: {e}")
+        sys.exit(1)
+
+    for target in targets:
+        if "hub_id" not in target or "season" not in target:
+            print(f"Each target needs a hub_id and a season; got {target}.")
+            sys.exit(1)
+        try:
+            target["cutoff"] = (
+                int(datetime.strptime(target["cutoff"], "%Y/%m/%d").timestamp())
+                if target.get("cutoff") is not None
+                else None
+            )
+        except ValueError:
+            print(
+                f"The cutoff date of {target['hub_id']} is in invalid format; "
+                f"please submit it in YYYY/MM/DD format."
+            )
+            sys.exit(1)
+    return targets
+
+
+#############################
+# Points the constants to the hub and season of the target, under the base directories in constants.py.
+# The matches of a season share a match directory (and thus a parse cache), while each hub keeps its own
+# logs, manifest and watermark in a subdirectory of the season. This differs from get_matches.py, which
+# keeps the logs of its single hub in the season directory itself, so a batch doesn't reuse those manifests.
+#############################
+def use_target(target):
+    constants.HUB_ID = target["hub_id"]
+    constants.SEASON = target["season"]
+    constants.MATCH_DIRECTORY = f"{constants.MATCH_BASE_DIRECTORY}/{target['season']}"
+    constants.LOG_DIRECTORY = f"{constants.LOG_BASE_DIRECTORY}/{target['season']}/{target['hub_id']}"
+
+
+def batch_log_directory(name):
+    return f"{constants.LOG_BASE_DIRECTORY}/batch={name}"
+
+
+#############################
+# Runs the stages of get_matches for each target in turn. The targets share the sessions and the rate
+# limiters of each API, so they would only wait for each other's budget if run at the same time.
+# A match listed by several targets is fetched only by the first of them.
+#############################
+@metrics.timed
+def fetch_targets(targets, args):
+    seen_faceit = set()
+    seen_dota = set()
+    for target in targets:
+        use_target(target)
+        print(f"Fetching the matches of hub {target['hub_id']} for {target['season']}.")
+        manifest = open_manifest()
+
+        faceit_match_ids = faceit.get_faceit_matches(
+            target["cutoff"], manifest, target.get("sync", False), page_workers=args.hub_workers
+        )
+        listed = len(faceit_match_ids)
+        faceit_match_ids = [m for m in faceit_match_ids if m not in seen_faceit]
+        seen_faceit.update(faceit_match_ids)
+        metrics.increment("fetch_targets.duplicates", listed - len(faceit_match_ids))
+        print(f"Skipping {listed - len(faceit_match_ids)} matches already listed for another target.")
+        # The later stages would fall back to reading the ID files if given nothing, so skip them instead
+        if len(faceit_match_ids) == 0:
+            continue
+
+        # Different FACEIT matches can still point to the same Dota match, e.g. if a hub is mirrored
+        dota_match_ids = faceit.get_ingame_ids(faceit_match_ids, manifest)
+        resolved = len(dota_match_ids)
+        dota_match_ids = [m for m in dota_match_ids if m not in seen_dota]
+        seen_dota.update(dota_match_ids)
+        metrics.increment("fetch_targets.duplicates", resolved - len(dota_match_ids))
+        if len(dota_match_ids) == 0:
+            continue
+
+        opendota.get_matches_from_opendota(dota_match_ids, args.workers, manifest)
+    print("Fetching the targets ran successfully.")
+
+
+#############################
+# Folds the matches of every season into one aggregate state, kept in the parse cache directory under
+# the name of the batch. The state knows which matches it has, so a match in several seasons counts once.
+#############################
+@metrics.timed
+def parse_targets(targets, args):
+    with metrics.stage("load_constants"):
+        hero_table = game_constants.hero_names(refresh=args.refresh_constants)
+        item_table = game_constants.item_names(refresh=args.refresh_constants)
+
+    path = f"{constants.PARSE_CACHE_DIRECTORY}/batch={args.name}/aggregate_state.pkl"
+    state = aggregate_state.AggregateState() if args.rebuild else aggregate_state.load_state(path)
+    for season in dict.fromkeys(target["season"] for target in targets):
+        use_target({"hub_id": "", "season": season})
+        if not os.path.isdir(constants.MATCH_DIRECTORY):
+            continue
+        print(f"Parsing the matches of {season}.")
+        aggregate_state.update_state(state, open_match_store(), args.parse_workers)
+    if state.aggregates is None:
+        print("No matches to parse.")
+        sys.exit(1)
+    aggregate_state.save_state(state, path)
+
+    constants.LOG_DIRECTORY = batch_log_directory(args.name)
+    if not os.path.isdir(constants.LOG_DIRECTORY):
+        os.makedirs(constants.LOG_DIRECTORY)
+    with metrics.stage("report"):
+        parse_matches.report_matches(state.aggregates, hero_table, item_table)
+    print("Program ran successfully.")
+
+
+def main():
+    # Fetches and parses several hubs and seasons in one go instead of editing constants.py between the runs.
+    # The statistics of all the targets are reported together into the log directory of the batch.
+    parser = argparse.ArgumentParser()
+    parser.add_argument("targets", help="JSON file with a list of hub_id/season targets")
+    # Names the combined state and log directory; the name of the targets file by default
+    parser.add_argument("--name")
+    parser.add_argument("--workers", type=int, default=constants.OPENDOTA_WORKERS)
+    parser.add_argument("--hub-workers", type=int, default=1)
+    parser.add_argument("--parse-workers", type=int, default=1)
+    # Only parses the matches that have already been downloaded
+    parser.add_argument("--skip-fetch", action="store_true")
+    parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument("--refresh-constants", action="store_true")
+    parser.add_argument("--profile", action="store_true")
+    args = parser.parse_args()
+    if args.name is None:
+        args.name = os.path.splitext(os.path.basename(args.targets))[0]
+    targets = load_targets(args.targets)
+
+    # The metrics of the run are saved into the log directory of the batch even if it fails midway
+    try:
+        with metrics.profiled("batch", args.profile):
+            if not args.skip_fetch:
+                fetch_targets(targets, args)
+            parse_targets(targets, args)
+    finally:
+        close_sessions()
+        constants.LOG_DIRECTORY = batch_log_directory(args.name)
+        metrics.write_metrics("batch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import constants
+import get_matches
+import json
+import shutil
+import sys
+import tempfile
+import time
+from benchmarks.mock_api import add_mock_arguments, mock_arguments, start_mock_api
+from match_store import open_match_store
+
+# Request rate limits in constants.py that --client-rate replaces
+CLIENT_RATE_LIMITS = [
+    "FACEIT_HUB_RATE_LIMIT",
+    "FACEIT_MATCH_RATE_LIMIT",
+    "OPENDOTA_RATE_LIMIT",
+]
+CLIENT_MAX_RATE_LIMITS = [
+    "FACEIT_HUB_MAX_RATE_LIMIT",
+    "FACEIT_MATCH_MAX_RATE_LIMIT",
+    "OPENDOTA_MAX_RATE_LIMIT",
+]
+
+
+#############################
+# Runs get_matches.main against the mock API in a temporary directory and measures the end-to-end
+# throughput. The client uses the rate limits in constants.py unless --client-rate is given, in which
+# case all of the APIs start at that rate and may adapt up to ten times of it.
+#############################
+def main():
+    parser = argparse.ArgumentParser()
+    add_mock_arguments(parser)
+    parser.add_argument("--workers", type=int, default=constants.OPENDOTA_WORKERS)
+    parser.add_argument("--pipeline", action="store_true")
+    parser.add_argument("--hub-workers", type=int, default=1)
+    parser.add_argument("--cutoff", help="YYYY/MM/DD; by default all the matches are fetched")
+    parser.add_argument("--client-rate", type=float)
+    # Keeps the downloaded matches and logs instead of removing them at the end
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    server = start_mock_api(**mock_arguments(args))
+    directory = tempfile.mkdtemp(prefix="fetch_benchmark_")
+    constants.FACEIT_DATA_API_URL = f"{server.url}/data/v4"
+    constants.FACEIT_INTERNAL_API_URL = server.url
+    constants.OPENDOTA_API_URL = f"{server.url}/api"
+    constants.HUB_ID = "mock-hub"
+    constants.LOG_DIRECTORY = f"{directory}/logs"
+    constants.MATCH_DIRECTORY = f"{directory}/matches"
+    if args.client_rate is not None:
+        for name in CLIENT_RATE_LIMITS:
+            setattr(constants, name, args.client_rate)
+        for name in CLIENT_MAX_RATE_LIMITS:
+            setattr(constants, name, 10 * args.client_rate)
+
+    sys.argv = ["get_matches.py", "--workers", str(args.workers), "--hub-workers", str(args.hub_workers)]
+    if args.pipeline:
+        sys.argv.append("--pipeline")
+    if args.cutoff is not None:
+        sys.argv.append(args.cutoff)
+    start = time.perf_counter()
+    try:
+        get_matches.main()
+    finally:
+        seconds = time.perf_counter() - start
+        server.shutdown()
+
+    with open(f"{constants.LOG_DIRECTORY}/faceit_match_ids.txt", "r") as f:
+        listed = len(f.readlines())
+    downloaded = len(open_match_store().match_ids())
+    print(f"Listed {listed} matches and downloaded {downloaded} of them in {seconds:.1f} seconds.")
+    print(f"{downloaded / seconds * 3600:.0f} matches/hour")
+    print("Responses of the mock API by status code:")
+    print(json.dumps(server.summary(), indent=4))
+
+    if args.keep:
+        print(f"The matches and logs were kept in {directory}.")
+    else:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
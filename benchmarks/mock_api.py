@@ -0,0 +1,255 @@
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from benchmarks.synthetic_matches import FIRST_MATCH_ID, generate_match
+
+# Served match payloads are copies of a few pregenerated matches with this ID replaced by the requested one
+PLACEHOLDER_MATCH_ID = 999999999999
+TEMPLATE_MATCHES = 20
+
+ROUTES = [
+    ("faceit_hub", re.compile(r"^/data/v4/hubs/[^/]+/matches$")),
+    ("faceit_match", re.compile(r"^/match/v2/match/([^/]+)$")),
+    ("opendota_match", re.compile(r"^/api/matches/(\d+)$")),
+    ("opendota_constants", re.compile(r"^/api/constants/(heroes|items)$")),
+]
+
+
+#############################
+# Stand-in for the FACEIT and OpenDota APIs, serving a hub of made up matches from one local address:
+# the hub listing (items/start/end), the internal match details (payload.clientCustom.dota_match_id),
+# the OpenDota matches (or 404) and the hero/item constants. Latency, 429 and 5xx responses and a rate
+# limit per API can be injected. The rate limit is a fixed window with the usual rate limit headers.
+#############################
+class MockApi(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port=0,
+        matches=1000,
+        latency=0.0,
+        jitter=0.0,
+        error_rate_429=0.0,
+        error_rate_5xx=0.0,
+        rate_limit=None,
+        rate_limit_window=1.0,
+        not_found_rate=0.05,
+        no_dota_id_rate=0.01,
+        cancelled_rate=0.02,
+        seed=1,
+    ):
+        super().__init__(("127.0.0.1", port), MockApiHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate_429 = error_rate_429
+        self.error_rate_5xx = error_rate_5xx
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.windows = {}
+        self.stats = {}
+
+        # Newest first, like the hub listing
+        now = int(time.time())
+        self.hub_matches = []
+        self.faceit_matches = {}
+        self.dota_matches = {}
+        for i in range(matches):
+            faceit_match_id = f"1-{i:08x}-mock"
+            cancelled = self.rng.random() < cancelled_rate
+            match = {
+                "match_id": faceit_match_id,
+                "status": "CANCELLED" if cancelled else "FINISHED",
+                "started_at": now - 3600 * (i + 1),
+            }
+            self.hub_matches.append(match)
+            if cancelled or self.rng.random() < no_dota_id_rate:
+                self.faceit_matches[faceit_match_id] = None
+                continue
+            dota_match_id = FIRST_MATCH_ID + i
+            self.faceit_matches[faceit_match_id] = dota_match_id
+            self.dota_matches[dota_match_id] = self.rng.random() >= not_found_rate
+
+        self.templates = [
+            json.dumps(generate_match(self.rng, PLACEHOLDER_MATCH_ID), separators=(",", ":")).encode()
+            for _ in range(TEMPLATE_MATCHES)
+        ]
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, route, status):
+        with self.lock:
+            route_stats = self.stats.setdefault(route, {})
+            route_stats[status] = route_stats.get(status, 0) + 1
+
+    def random(self):
+        with self.lock:
+            return self.rng.random()
+
+    # Takes a request from the current window of the API. Returns whether it was allowed,
+    # how many requests are left in the window and the seconds until the window resets.
+    def take_from_window(self, route):
+        api = route.split("_")[0]
+        with self.lock:
+            now = time.monotonic()
+            start, used = self.windows.get(api, (now, 0))
+            if now - start >= self.rate_limit_window:
+                start, used = now, 0
+            allowed = used < self.rate_limit
+            if allowed:
+                used += 1
+            self.windows[api] = (start, used)
+            return allowed, self.rate_limit - used, self.rate_limit_window - (now - start)
+
+    def summary(self):
+        return {route: dict(sorted(statuses.items())) for route, statuses in sorted(self.stats.items())}
+
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, route, status, body=b"", headers=None):
+        self.server.count(route, status)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, route, data, headers=None):
+        self.send(route, 200, json.dumps(data).encode(), headers)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        for route, pattern in ROUTES:
+            found = pattern.match(url.path)
+            if found is not None:
+                break
+        else:
+            self.send("unknown", 404)
+            return
+
+        if server.latency > 0 or server.jitter > 0:
+            time.sleep(max(0.0, server.latency + server.jitter * (2 * server.random() - 1)))
+
+        headers = {}
+        if server.rate_limit is not None:
+            allowed, remaining, reset = server.take_from_window(route)
+            headers = {"X-RateLimit-Remaining": str(remaining), "X-RateLimit-Reset": f"{reset:.3f}"}
+            if not allowed:
+                self.send(route, 429, b"", headers | {"Retry-After": str(math.ceil(reset))})
+                return
+        if server.random() < server.error_rate_429:
+            self.send(route, 429, b"", {"Retry-After": "1"})
+            return
+        if server.random() < server.error_rate_5xx:
+            self.send(route, 503 if server.random() < 0.5 else 500)
+            return
+
+        if route == "faceit_hub":
+            query = parse_qs(url.query)
+            offset = int(query.get("offset", ["0"])[0])
+            limit = int(query.get("limit", ["20"])[0])
+            items = server.hub_matches[offset : offset + limit]
+            self.send_json(route, {"items": items, "start": offset, "end": offset + len(items)}, headers)
+
+        elif route == "faceit_match":
+            faceit_match_id = found.group(1)
+            if faceit_match_id not in server.faceit_matches:
+                self.send(route, 404)
+                return
+            payload = {"id": faceit_match_id, "status": "FINISHED"}
+            if server.faceit_matches[faceit_match_id] is not None:
+                payload["clientCustom"] = {"dota_match_id": server.faceit_matches[faceit_match_id]}
+            self.send_json(route, {"payload": payload}, headers)
+
+        elif route == "opendota_match":
+            match_id = int(found.group(1))
+            if not server.dota_matches.get(match_id, False):
+                self.send(route, 404, b'{"error":"Not Found"}', headers)
+                return
+            template = server.templates[match_id % len(server.templates)]
+            body = template.replace(str(PLACEHOLDER_MATCH_ID).encode(), str(match_id).encode())
+            self.send(route, 200, body, headers)
+
+        elif found.group(1) == "heroes":
+            heroes = {str(i): {"id": i, "localized_name": f"Hero {i}"} for i in range(1, 139)}
+            self.send_json(route, heroes, headers)
+        else:
+            items = {f"item_{i}": {"id": i, "dname": f"Item {i}"} for i in range(300)}
+            self.send_json(route, items, headers)
+
+
+#############################
+# Starts the server in a background thread and returns it; call shutdown() to stop it.
+#############################
+def start_mock_api(**kwargs):
+    server = MockApi(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_mock_arguments(parser):
+    parser.add_argument("--matches", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-429", type=float, default=0.0)
+    parser.add_argument("--error-5xx", type=float, default=0.0)
+    # Requests allowed per API in each rate limit window (seconds)
+    parser.add_argument("--rate-limit", type=int)
+    parser.add_argument("--rate-limit-window", type=float, default=1.0)
+    parser.add_argument("--not-found", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def mock_arguments(args):
+    return {
+        "matches": args.matches,
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "error_rate_429": args.error_429,
+        "error_rate_5xx": args.error_5xx,
+        "rate_limit": args.rate_limit,
+        "rate_limit_window": args.rate_limit_window,
+        "not_found_rate": args.not_found,
+        "seed": args.seed,
+    }
+
+
+# Runs the server in the foreground, e.g. to point the URLs in constants.py to it by hand
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8080)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockApi(port=args.port, **mock_arguments(args))
+    print(f"Serving {args.matches} mock matches at {server.url}")
+    print(f'FACEIT_DATA_API_URL = "{server.url}/data/v4"')
+    print(f'FACEIT_INTERNAL_API_URL = "{server.url}"')
+    print(f'OPENDOTA_API_URL = "{server.url}/api"')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.summary(), indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import argparse
+import json
+import pandas as pd
+import time
+import tracemalloc
+from analysis import buildings
+from analysis import items
+from analysis import picks_bans
+from analysis import report
+from analysis.aggregate_state import AggregateState
+from analysis.extract import PlayerColumns, decode, extract_match
+from benchmarks.synthetic_matches import generate_store
+
+STAGES = ["read", "decode", "extract", "build", "aggregate", "report"]
+
+# Regressions smaller than this (relative to the baseline) are considered noise
+REGRESSION_THRESHOLD = 0.1
+
+HERO_TABLE = {hero_id: f"Hero {hero_id}" for hero_id in range(1, 139)}
+
+
+#############################
+# Reads, decodes and extracts the matches one at a time like parse_cache.extract_chunk does,
+# timing each step separately. Returns the seconds spent in each step and the extracted rows.
+#############################
+def extract_stage(store, match_ids):
+    seconds = {"read": 0.0, "decode": 0.0, "extract": 0.0}
+    player_columns = PlayerColumns(capacity=10 * len(match_ids))
+    pickban_rows = []
+    building_rows = []
+
+    matches = store.iter_raw(match_ids)
+    while True:
+        start = time.perf_counter()
+        raw = next(matches, None)
+        seconds["read"] += time.perf_counter() - start
+        if raw is None:
+            break
+
+        start = time.perf_counter()
+        match_json = decode(raw[1])
+        seconds["decode"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        pickbans, building_row = extract_match(match_json, player_columns)
+        pickban_rows.extend(pickbans)
+        building_rows.append(building_row)
+        seconds["extract"] += time.perf_counter() - start
+
+    return seconds, (player_columns, pickban_rows, building_rows)
+
+
+def build_stage(player_columns, pickban_rows, building_rows):
+    return player_columns.to_frame(), pd.DataFrame(pickban_rows), pd.DataFrame(building_rows)
+
+
+# Everything parse_matches.py computes from the aggregates, without printing or writing files
+def report_stage(aggregates):
+    pb_df = picks_bans.hero_stats(aggregates["heroes"], HERO_TABLE)
+    pb_df["picked_winrate"] = (pb_df["picked_wins"] / pb_df["picked_games"]).fillna(0.0).round(2)
+    pb_df["banned_winrate"] = (pb_df["banned_wins"] / pb_df["banned_games"]).fillna(0.0).round(2)
+    return report.to_json_types(
+        {
+            "players": report.player_report(aggregates["players"], HERO_TABLE),
+            "picks_and_bans": report.pickban_report(pb_df),
+            "first_picks": picks_bans.first_pick_stats(aggregates["heroes"], HERO_TABLE),
+            "phases": picks_bans.phase_stats(aggregates["phases"], aggregates["pickban_matches"], HERO_TABLE),
+            "hero_pairings": picks_bans.hero_pairs(aggregates["pairs"], HERO_TABLE),
+            "destruction_rates": buildings.destruction_rates(aggregates["destruction"]),
+            "items": report.item_report(items.item_stats(aggregates["items"], aggregates["hero_games"], {})),
+            "hero_item_builds": items.hero_builds(
+                aggregates["hero_items"], aggregates["hero_games"], HERO_TABLE, {}
+            ),
+        }
+    )
+
+
+#############################
+# Runs all the stages once. Returns the seconds and, if memory is traced, the peak amount of memory
+# allocated during each stage. Read, decode and extract are interleaved, so they share the peak.
+#############################
+def run_stages(store, match_ids, trace_memory=False):
+    seconds = {}
+    peaks = {}
+
+    def run(stage, function, *args):
+        if trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        result = function(*args)
+        seconds[stage] = time.perf_counter() - start
+        if trace_memory:
+            peaks[stage] = tracemalloc.get_traced_memory()[1]
+        return result
+
+    if trace_memory:
+        tracemalloc.start()
+    extract_seconds, rows = run("extract", extract_stage, store, match_ids)
+    seconds.update(extract_seconds)
+    if trace_memory:
+        for stage in extract_seconds:
+            peaks[stage] = peaks["extract"]
+    tables = run("build", build_stage, *rows)
+    del rows
+    aggregates = run("aggregate", AggregateState.compute, *tables)
+    run("report", report_stage, aggregates)
+    if trace_memory:
+        tracemalloc.stop()
+    return seconds, peaks
+
+
+#############################
+# Benchmarks the parse stages on the given amount of synthetic matches, generating them first if needed.
+# Times are measured on a separate run from the memory since tracing the allocations slows everything down.
+#############################
+def benchmark(count, seed=1, trace_memory=True):
+    store, generated = generate_store(f"./matches/synthetic_{count}", count, seed)
+    if generated > 0:
+        print(f"Generated {generated} synthetic matches into {store.directory}.")
+    match_ids = store.match_ids()[:count]
+
+    seconds, _ = run_stages(store, match_ids)
+    peaks = run_stages(store, match_ids, trace_memory=True)[1] if trace_memory else {}
+    seconds["total"] = sum(seconds[stage] for stage in STAGES)
+    if trace_memory:
+        peaks["total"] = max(peaks.values())
+
+    return {
+        stage: {
+            "seconds": round(seconds[stage], 4),
+            "matches_per_second": round(count / seconds[stage], 1) if seconds[stage] > 0 else None,
+            "peak_mb": round(peaks[stage] / 2**20, 1) if stage in peaks else None,
+        }
+        for stage in STAGES + ["total"]
+    }
+
+
+def print_results(count, results, baseline=None):
+    print(f"{count} matches:")
+    print(f"{'stage':<10} {'seconds':>10} {'matches/s':>12} {'peak MB':>10}")
+    for stage, result in results.items():
+        line = (
+            f"{stage:<10} {result['seconds']:>10.3f} {result['matches_per_second'] or 0:>12.1f}"
+            f" {result['peak_mb'] if result['peak_mb'] is not None else '-':>10}"
+        )
+        if baseline is not None and stage in baseline:
+            previous = baseline[stage]["seconds"]
+            change = result["seconds"] / previous - 1 if previous > 0 else 0.0
+            line += f"  {change:+.0%}" + ("  SLOWER" if change > REGRESSION_THRESHOLD else "")
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, nargs="+", default=[1000])
+    parser.add_argument("--seed", type=int, default=1)
+    # Skips the second run that traces the memory use
+    parser.add_argument("--no-memory", action="store_true")
+    # Saves the results, and compares them to earlier saved results, respectively
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline is not None:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+    all_results = {}
+    for count in args.matches:
+        results = benchmark(count, args.seed, not args.no_memory)
+        print_results(count, results, baseline.get(str(count)))
+        all_results[str(count)] = results
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(all_results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
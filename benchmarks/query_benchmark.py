@@ -0,0 +1,52 @@
+import argparse
+import numpy as np
+import time
+from analysis import parse_cache
+from analysis.query import MatchDataset
+from benchmarks.parse_benchmark import HERO_TABLE
+from benchmarks.synthetic_matches import generate_store
+
+QUERIES = ["player_history", "player_summary", "hero_summary", "hero_matchups", "match"]
+
+
+#############################
+# Times each query of analysis/query.py on random accounts, heroes and matches of the synthetic matches.
+# Prints the time to load and index the dataset and the mean and slowest time of each query.
+#############################
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    store, generated = generate_store(f"./matches/synthetic_{args.matches}", args.matches, args.seed)
+    if generated > 0:
+        print(f"Generated {generated} synthetic matches into {store.directory}.")
+    tables = parse_cache.extract_tables(store, store.match_ids()[: args.matches])
+
+    start = time.perf_counter()
+    dataset = MatchDataset(*tables, HERO_TABLE)
+    print(f"Indexed {len(dataset.players)} player rows in {time.perf_counter() - start:.3f} seconds.")
+
+    rng = np.random.default_rng(args.seed)
+    keys = {
+        "player_history": rng.choice(dataset.account_ids[dataset.account_ids >= 0], args.queries),
+        "player_summary": rng.choice(dataset.account_ids[dataset.account_ids >= 0], args.queries),
+        "hero_summary": rng.choice(dataset.hero_ids, args.queries),
+        "hero_matchups": rng.choice(dataset.hero_ids, args.queries),
+        "match": rng.choice(dataset.match_ids, args.queries),
+    }
+    print(f"{'query':<16} {'mean ms':>10} {'max ms':>10}")
+    for query in QUERIES:
+        function = getattr(dataset, query)
+        seconds = []
+        for key in keys[query]:
+            start = time.perf_counter()
+            function(int(key))
+            seconds.append(time.perf_counter() - start)
+        print(f"{query:<16} {np.mean(seconds) * 1000:>10.3f} {np.max(seconds) * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
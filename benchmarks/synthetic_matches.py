@@ -0,0 +1,176 @@
+import argparse
+import json
+import random
+from match_store import MatchStore
+
+FIRST_MATCH_ID = 7000000000
+HERO_IDS = list(range(1, 139))
+ITEM_IDS = [0, 1, 29, 36, 48, 50, 63, 65, 96, 108, 110, 116, 127, 141, 147, 154, 160, 168, 174, 208, 231, 250]
+NEUTRAL_ITEM_IDS = [0, 349, 354, 355, 357, 358, 359, 1158, 1164, 1167]
+
+# Captains mode draft: (is_pick, picking team relative to the team with the first pick)
+# 7 bans, 2 picks, 3 bans, 6 picks, 4 bans and 2 picks in three phases, like in the 7.3x patches
+CAPTAINS_MODE_DRAFT = (
+    [(False, t) for t in [0, 1, 0, 1, 0, 1, 1]]
+    + [(True, t) for t in [0, 1]]
+    + [(False, t) for t in [0, 0, 1]]
+    + [(True, t) for t in [1, 0, 0, 1, 1, 0]]
+    + [(False, t) for t in [0, 1, 1, 0]]
+    + [(True, t) for t in [0, 1]]
+)
+
+
+def building_status(rng, width, won, lost_top_bits=0):
+    status = 0
+    for bit in range(width):
+        status |= (rng.random() < (0.85 if won else 0.3)) << bit
+    # The buildings in the highest bits have to fall before the team can lose
+    if not won:
+        status &= (1 << (width - lost_top_bits)) - 1
+    return status
+
+
+def generate_player(rng, slot, hero_id, match_id, duration, radiant_win):
+    minutes = duration / 60
+    kills, deaths, assists = rng.randint(0, 25), rng.randint(0, 15), rng.randint(0, 35)
+    gold_per_min, xp_per_min = rng.randint(200, 900), rng.randint(250, 1000)
+    is_radiant = slot < 5
+    # A fraction of the players have their profile hidden and no account ID
+    account_id = None if rng.random() < 0.05 else rng.randint(1, 400000000)
+    player = {
+        "match_id": match_id,
+        "player_slot": slot if is_radiant else 123 + slot,
+        "account_id": account_id,
+        "hero_id": hero_id,
+        "isRadiant": is_radiant,
+        "radiant_win": radiant_win,
+        "win": int(is_radiant == radiant_win),
+        "duration": duration,
+        "kills": kills,
+        "deaths": deaths,
+        "assists": assists,
+        "kda": round((kills + assists) / (deaths + 1), 2),
+        "kills_per_min": round(kills / minutes, 3),
+        "last_hits": int(rng.randint(2, 12) * minutes),
+        "denies": rng.randint(0, 40),
+        "gold_per_min": gold_per_min,
+        "xp_per_min": xp_per_min,
+        "level": min(30, 5 + int(minutes / 2.5)),
+        "total_gold": int(gold_per_min * minutes),
+        "total_xp": int(xp_per_min * minutes),
+        "gold_spent": int(gold_per_min * minutes * rng.uniform(0.7, 1.0)),
+        "net_worth": int(gold_per_min * minutes * rng.uniform(0.5, 1.1)),
+        "hero_damage": rng.randint(2000, 90000),
+        "hero_healing": rng.choice([0, 0, 0, rng.randint(0, 25000)]),
+        "tower_damage": rng.randint(0, 20000),
+        "item_neutral": rng.choice(NEUTRAL_ITEM_IDS),
+    }
+    if account_id is not None:
+        player["personaname"] = f"player{account_id % 5000}"
+    for i in range(6):
+        player[f"item_{i}"] = rng.choice(ITEM_IDS)
+    for i in range(4):
+        player[f"backpack_{i}"] = rng.choice(ITEM_IDS)
+
+    # The real matches have a lot of per minute and per event data that the analysis doesn't use
+    # but which still has to be decoded; this makes the size of the synthetic matches comparable.
+    player["gold_t"] = [int(gold_per_min * m * rng.uniform(0.8, 1.0)) for m in range(int(minutes) + 1)]
+    player["xp_t"] = [int(xp_per_min * m * rng.uniform(0.8, 1.0)) for m in range(int(minutes) + 1)]
+    player["lh_t"] = [int(m * rng.uniform(2, 10)) for m in range(int(minutes) + 1)]
+    player["times"] = [m * 60 for m in range(int(minutes) + 1)]
+    player["purchase_log"] = [
+        {"time": rng.randint(-90, duration), "key": f"item_{rng.choice(ITEM_IDS)}"}
+        for _ in range(rng.randint(20, 45))
+    ]
+    player["kills_log"] = [
+        {"time": rng.randint(0, duration), "key": f"npc_dota_hero_{rng.choice(HERO_IDS)}"}
+        for _ in range(kills)
+    ]
+    player["ability_upgrades_arr"] = [rng.randint(5000, 9000) for _ in range(player["level"])]
+    player["damage"] = {f"npc_dota_hero_{rng.choice(HERO_IDS)}": rng.randint(0, 20000) for _ in range(8)}
+    return player
+
+
+#############################
+# Generates a single match shaped like the ones returned by the OpenDota API: a captains mode draft,
+# 10 players with the keys in constants.PLAYER_KEYS (and plenty of others) and the building bitmasks.
+#############################
+def generate_match(rng, match_id):
+    radiant_win = rng.random() < 0.5
+    duration = int(rng.gauss(2400, 600))
+    duration = max(900, min(duration, 5400))
+
+    heroes = rng.sample(HERO_IDS, len(CAPTAINS_MODE_DRAFT))
+    first_pick_team = rng.randint(0, 1)
+    picks_bans = [
+        {"order": order, "team": (first_pick_team + team) % 2, "hero_id": hero_id, "is_pick": is_pick}
+        for order, ((is_pick, team), hero_id) in enumerate(zip(CAPTAINS_MODE_DRAFT, heroes))
+    ]
+    picks = {0: [], 1: []}
+    for pickban in picks_bans:
+        if pickban["is_pick"]:
+            picks[pickban["team"]].append(pickban["hero_id"])
+    player_heroes = picks[0] + picks[1]
+
+    return {
+        "match_id": match_id,
+        "start_time": 1700000000 + (match_id - FIRST_MATCH_ID) * 600,
+        "duration": duration,
+        "game_mode": 2,
+        "lobby_type": 1,
+        "radiant_win": radiant_win,
+        "radiant_score": rng.randint(10, 60),
+        "dire_score": rng.randint(10, 60),
+        "barracks_status_dire": building_status(rng, 6, not radiant_win),
+        "barracks_status_radiant": building_status(rng, 6, radiant_win),
+        "tower_status_dire": building_status(rng, 11, not radiant_win, 2),
+        "tower_status_radiant": building_status(rng, 11, radiant_win, 2),
+        "picks_bans": picks_bans,
+        "players": [
+            generate_player(rng, slot, player_heroes[slot], match_id, duration, radiant_win)
+            for slot in range(10)
+        ],
+        "objectives": [
+            {"time": rng.randint(0, duration), "type": "building_kill", "key": f"tower_{rng.randint(1, 4)}"}
+            for _ in range(rng.randint(5, 25))
+        ],
+        "radiant_gold_adv": [rng.randint(-20000, 20000) for _ in range(duration // 60 + 1)],
+        "radiant_xp_adv": [rng.randint(-20000, 20000) for _ in range(duration // 60 + 1)],
+    }
+
+
+#############################
+# Fills a match store in the given directory with the given amount of synthetic matches. The same seed
+# always produces the same matches, and matches that are already in the store are not generated again.
+#############################
+def generate_store(directory, count, seed=1):
+    store = MatchStore(directory)
+    if all(store.contains(match_id) for match_id in range(FIRST_MATCH_ID, FIRST_MATCH_ID + count)):
+        return store, 0
+
+    rng = random.Random(seed)
+    generated = 0
+    for match_id in range(FIRST_MATCH_ID, FIRST_MATCH_ID + count):
+        # Draw the match anyway so that the following matches stay the same
+        match_json = generate_match(rng, match_id)
+        if store.contains(match_id):
+            continue
+        store.put(match_id, json.dumps(match_json, separators=(",", ":")).encode())
+        generated += 1
+    return store, generated
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("count", type=int)
+    parser.add_argument("--directory")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    directory = args.directory if args.directory is not None else f"./matches/synthetic_{args.count}"
+    _, generated = generate_store(directory, args.count, args.seed)
+    print(f"Generated {generated} matches into {directory}.")
+
+
+if __name__ == "__main__":
+    main()
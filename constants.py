@@ -1,8 +1,47 @@
 APP_API_KEY = ""
 PERSONAL_API_KEY = ""
 HUB_ID = ""
-MATCH_DIRECTORY = "./matches/seasonX"
-LOG_DIRECTORY = "./logs/seasonX"
+SEASON = "seasonX"
+# The matches and logs of each season go into a directory of their own under these
+MATCH_BASE_DIRECTORY = "./matches"
+LOG_BASE_DIRECTORY = "./logs"
+MATCH_DIRECTORY = f"{MATCH_BASE_DIRECTORY}/{SEASON}"
+LOG_DIRECTORY = f"{LOG_BASE_DIRECTORY}/{SEASON}"
+# The data extracted from the matches is kept here in columnar files, partitioned by season
+PARSE_CACHE_DIRECTORY = "./cache"
+
+# Hero and item constants fetched from OpenDota are kept here and refetched once they are older than this
+GAME_CONSTANTS_DIRECTORY = f"{PARSE_CACHE_DIRECTORY}/constants"
+GAME_CONSTANTS_MAX_AGE_HOURS = 24
+
+# Building destruction rates are split into match duration buckets with these limits (in minutes)
+DURATION_BUCKET_MINUTES = [30, 40, 50]
+
+# The downloaded matches are appended compressed into segment files of roughly this size (in bytes)
+MATCH_SEGMENT_SIZE = 256 * 1024 * 1024
+
+# Base URLs of the APIs; can be pointed to a local mock server for testing (see benchmarks/mock_api.py)
+FACEIT_DATA_API_URL = "https://open.faceit.com/data/v4"
+FACEIT_INTERNAL_API_URL = "https://api.faceit.com"
+OPENDOTA_API_URL = "https://api.opendota.com/api"
+
+# Starting and maximum request rates (requests per second) for each API. The rates adapt between
+# a tenth of the starting rate and the maximum based on the rate limit headers and 429 responses.
+# The internal FACEIT API has strict, undocumented rate limits, so it is kept slow.
+FACEIT_HUB_RATE_LIMIT = 1.0
+FACEIT_HUB_MAX_RATE_LIMIT = 4.0
+FACEIT_MATCH_RATE_LIMIT = 1 / 3
+FACEIT_MATCH_MAX_RATE_LIMIT = 1.0
+
+# OpenDota allows 60 requests per minute on the free tier. The workers only keep several requests
+# in flight at once; the token bucket (rate per second and burst size) decides the actual pace.
+OPENDOTA_WORKERS = 4
+OPENDOTA_RATE_LIMIT = 1.0
+OPENDOTA_MAX_RATE_LIMIT = 5.0
+OPENDOTA_BURST = 1
+
+# Maximum amount of IDs waiting between two stages when get_matches is run with --pipeline
+PIPELINE_QUEUE_SIZE = 100
 
 PLAYER_KEYS = [
     "account_id",
@@ -42,6 +81,49 @@ PLAYER_KEYS = [
     "xp_per_min",
 ]
 
+# Column types of the player DataFrame. The nullable integer and boolean types are only as wide as
+# the values need, and heroes, items and names repeat a lot, so they are stored as categories.
+PLAYER_DTYPES = {
+    "account_id": "Int64",
+    "assists": "Int16",
+    "backpack_0": "category",
+    "backpack_1": "category",
+    "backpack_2": "category",
+    "backpack_3": "category",
+    "deaths": "Int16",
+    "denies": "Int16",
+    "duration": "Int32",
+    "gold_per_min": "Int16",
+    "gold_spent": "Int32",
+    "hero_damage": "Int32",
+    "hero_healing": "Int32",
+    "hero_id": "category",
+    "isRadiant": "boolean",
+    "item_0": "category",
+    "item_1": "category",
+    "item_2": "category",
+    "item_3": "category",
+    "item_4": "category",
+    "item_5": "category",
+    "item_neutral": "category",
+    "kda": "float32",
+    "kills": "Int16",
+    "kills_per_min": "float32",
+    "last_hits": "Int16",
+    "level": "Int8",
+    "match_id": "Int64",
+    "net_worth": "Int32",
+    "personaname": "category",
+    "radiant_win": "boolean",
+    "total_gold": "Int32",
+    "total_xp": "Int32",
+    "tower_damage": "Int32",
+    "xp_per_min": "Int16",
+}
+
+# Items used in fewer games than this are left out of the item winrate leaderboards
+ITEM_MIN_GAMES = 20
+
 TOTAL_STATS = [
     "kills",
     "assists",
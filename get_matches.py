@@ -1,8 +1,36 @@
 import argparse
+import constants
+import metrics
 import sys
 from datetime import datetime
 from api_calls import faceit
 from api_calls import opendota
+from api_calls import pipeline
+from api_calls.manifest import open_manifest
+from api_calls.sessions import close_sessions
+
+
+#############################
+# Runs the stages one after another, or all at once with --pipeline.
+#############################
+def fetch_matches(cutoff, args):
+    # Since the runtime is an hour or two, these can be run one at a time by commenting out the rest,
+    # but they MUST be run in order. The progress of each stage is also recorded in a manifest in the log
+    # directory, so after a crash simply rerunning the script skips the work that was already done.
+    manifest = open_manifest()
+    if args.pipeline:
+        pipeline.run_pipeline(cutoff, manifest, args.sync, args.workers, args.hub_workers)
+        print("get_matches ran successfully.")
+        return
+
+    faceit_match_ids = faceit.get_faceit_matches(cutoff, manifest, args.sync, page_workers=args.hub_workers)
+    # The later stages would fall back to reading the ID files if given nothing, so stop here instead
+    if args.sync and len(faceit_match_ids) == 0:
+        print("No new matches since the last run.")
+        return
+    dota_match_ids = faceit.get_ingame_ids(faceit_match_ids, manifest)
+    opendota.get_matches_from_opendota(dota_match_ids, args.workers, manifest)
+    print("get_matches ran successfully.")
 
 
 def main():
@@ -11,6 +39,16 @@ def main():
     # the seasons. Fetching all matches can be achieved by omitting the argument when running the script.
     parser = argparse.ArgumentParser()
     parser.add_argument("date", nargs="?")  # YYYY/MM/DD format
+    # Amount of concurrent OpenDota downloads; the rate limit in constants.py applies regardless.
+    parser.add_argument("--workers", type=int, default=constants.OPENDOTA_WORKERS)
+    # Fetch only the matches played after the newest match that the previous runs have listed.
+    parser.add_argument("--sync", action="store_true")
+    # Run all the stages at the same time, passing the IDs on as soon as they are found.
+    parser.add_argument("--pipeline", action="store_true")
+    # Amount of hub pages fetched at the same time. With more than one, the last page needed is found first.
+    parser.add_argument("--hub-workers", type=int, default=1)
+    # Run under cProfile and save the profile next to the metrics
+    parser.add_argument("--profile", action="store_true")
     args = parser.parse_args()
     try:
         cutoff = int(datetime.strptime(args.date, "%Y/%m/%d").timestamp())
@@ -28,12 +66,13 @@ def main():
         )
         sys.exit(1)
 
-    # Since the runtime is an hour or two, these can be run one at a time by commenting out the rest,
-    # but they MUST be run in order.
-    faceit_match_ids = faceit.get_faceit_matches(cutoff)
-    dota_match_ids = faceit.get_ingame_ids(faceit_match_ids)
-    opendota.get_matches_from_opendota(dota_match_ids)
-    print("get_matches ran successfully.")
+    # The metrics of the run are saved into the log directory even if it fails midway
+    try:
+        with metrics.profiled("get_matches", args.profile):
+            fetch_matches(cutoff, args)
+    finally:
+        close_sessions()
+        metrics.write_metrics("get_matches")
 
 
 if __name__ == "__main__":
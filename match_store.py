@@ -0,0 +1,144 @@
+import constants
+import json
+import os
+import threading
+import zlib
+
+INDEX_FILE = "index.txt"
+
+
+#############################
+# Compressed storage for the downloaded matches. Each match is compressed separately with zlib and
+# appended to a segment file; the index file has a line "match_id segment offset length" for each match,
+# so single matches can be looked up without scanning the directory or decompressing the others.
+# The index line is written only after the match data, so a crash can't leave an entry pointing to
+# incomplete data. Matches saved as plain JSON files by earlier versions are read as well.
+#############################
+class MatchStore:
+    def __init__(self, directory, segment_size=None):
+        self.directory = directory
+        self.segment_size = segment_size if segment_size is not None else constants.MATCH_SEGMENT_SIZE
+        self.lock = threading.Lock()
+        self.index = {}
+        self.segment = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        index_path = f"{directory}/{INDEX_FILE}"
+        if os.path.isfile(index_path):
+            with open(index_path, "r") as f:
+                for line in f:
+                    parts = line.split()
+                    # Skip a line that was cut off by a crash
+                    if len(parts) != 4:
+                        continue
+                    match_id, segment, offset, length = parts
+                    self.index[match_id] = (int(segment), int(offset), int(length))
+                    self.segment = max(self.segment, int(segment))
+
+    def segment_path(self, segment):
+        return f"{self.directory}/segment_{segment:05d}.bin"
+
+    def json_path(self, match_id):
+        return f"{self.directory}/{match_id}.json"
+
+    def contains(self, match_id):
+        return str(match_id) in self.index or os.path.isfile(self.json_path(match_id))
+
+    # Takes the match as the raw JSON bytes returned by the API, so it doesn't need to be decoded here
+    def put(self, match_id, raw):
+        data = zlib.compress(raw)
+        with self.lock:
+            path = self.segment_path(self.segment)
+            if os.path.isfile(path) and os.path.getsize(path) >= self.segment_size:
+                self.segment += 1
+                path = self.segment_path(self.segment)
+
+            with open(path, "ab") as f:
+                offset = f.tell()
+                f.write(data)
+            with open(f"{self.directory}/{INDEX_FILE}", "a") as f:
+                f.write(f"{match_id} {self.segment} {offset} {len(data)}\n")
+            self.index[str(match_id)] = (self.segment, offset, len(data))
+
+    def get_raw(self, match_id):
+        match_id = str(match_id)
+        if match_id not in self.index:
+            with open(self.json_path(match_id), "rb") as f:
+                return f.read()
+
+        segment, offset, length = self.index[match_id]
+        with open(self.segment_path(segment), "rb") as f:
+            f.seek(offset)
+            return zlib.decompress(f.read(length))
+
+    def get(self, match_id):
+        return json.loads(self.get_raw(match_id))
+
+    # IDs of all the stored matches, including the ones saved as plain JSON files
+    def match_ids(self):
+        match_ids = set(self.index)
+        for file in os.listdir(self.directory):
+            if file.endswith(".json"):
+                match_ids.add(file[: -len(".json")])
+        return sorted(match_ids)
+
+    # Yields (match_id, raw JSON bytes) pairs. Reads the segments in order so that the disk is read sequentially.
+    def iter_raw(self, match_ids=None):
+        if match_ids is None:
+            match_ids = self.match_ids()
+        stored = sorted(
+            (self.index[match_id], match_id) for match_id in match_ids if match_id in self.index
+        )
+
+        f = None
+        current_segment = None
+        for (segment, offset, length), match_id in stored:
+            if segment != current_segment:
+                if f is not None:
+                    f.close()
+                f = open(self.segment_path(segment), "rb")
+                current_segment = segment
+            f.seek(offset)
+            yield match_id, zlib.decompress(f.read(length))
+        if f is not None:
+            f.close()
+
+        for match_id in match_ids:
+            if match_id not in self.index:
+                with open(self.json_path(match_id), "rb") as f:
+                    yield match_id, f.read()
+
+    def iter_matches(self, match_ids=None):
+        for match_id, raw in self.iter_raw(match_ids):
+            yield match_id, json.loads(raw)
+
+
+def open_match_store():
+    return MatchStore(constants.MATCH_DIRECTORY)
+
+
+#############################
+# Moves the matches saved as plain JSON files by earlier versions into the compressed store.
+# Each file is removed only after the match has been stored.
+#############################
+def main():
+    store = open_match_store()
+    migrated = 0
+    for file in sorted(os.listdir(store.directory)):
+        if not file.endswith(".json"):
+            continue
+        match_id = file[: -len(".json")]
+        if match_id not in store.index:
+            with open(store.json_path(match_id), "r") as f:
+                # Re-encode without the indentation; it only takes space
+                raw = json.dumps(json.load(f), separators=(",", ":")).encode()
+            store.put(match_id, raw)
+        os.remove(store.json_path(match_id))
+        migrated += 1
+    print(f"Moved {migrated} matches into the store in {store.directory}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import constants
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Upper bounds (in seconds) of the latency histogram buckets; the last bucket has everything slower
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+#############################
+# Counters, stage timers and histograms of a single run. The counters of a stage are named
+# "<stage>.<what>" (e.g. "download.bytes"), so that their rates per second can be computed from
+# the wall time of the stage when the metrics are written. Safe to update from several threads.
+#############################
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {}
+        self.stages = {}
+        self.histograms = {}
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = {
+                    "count": 0,
+                    "sum": 0.0,
+                    "min": value,
+                    "max": value,
+                    "buckets": {str(bound): 0 for bound in buckets} | {"inf": 0},
+                }
+            histogram = self.histograms[name]
+            histogram["count"] += 1
+            histogram["sum"] += value
+            histogram["min"] = min(histogram["min"], value)
+            histogram["max"] = max(histogram["max"], value)
+            bucket = next((str(bound) for bound in buckets if value <= bound), "inf")
+            histogram["buckets"][bucket] += 1
+
+    def add_stage_time(self, name, seconds):
+        with self.lock:
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "runs": 0})
+            stage["seconds"] += seconds
+            stage["runs"] += 1
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage_time(name, time.perf_counter() - start)
+
+    def rates(self):
+        rates = {}
+        for name, value in self.counters.items():
+            stage = name.split(".")[0]
+            if stage in self.stages and self.stages[stage]["seconds"] > 0:
+                rates[f"{name}_per_second"] = round(value / self.stages[stage]["seconds"], 2)
+        return rates
+
+    def to_dict(self):
+        with self.lock:
+            histograms = {
+                name: histogram | {"mean": histogram["sum"] / histogram["count"]}
+                for name, histogram in self.histograms.items()
+            }
+            return {
+                "started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                "seconds": round(time.time() - self.started, 3),
+                "command": sys.argv,
+                "stages": {
+                    name: stage | {"seconds": round(stage["seconds"], 3)} for name, stage in self.stages.items()
+                },
+                "counters": dict(self.counters),
+                "rates": self.rates(),
+                "histograms": histograms,
+            }
+
+
+# The metrics of the current run; everything records into this one
+metrics = Metrics()
+
+
+def increment(name, amount=1):
+    metrics.increment(name, amount)
+
+
+def observe(name, value):
+    metrics.observe(name, value)
+
+
+def stage(name):
+    return metrics.stage(name)
+
+
+# Decorator that times every call of the function as a stage named after the function
+def timed(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with metrics.stage(function.__name__):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def run_path(script, extension):
+    directory = f"{constants.LOG_DIRECTORY}/metrics"
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    started = datetime.fromtimestamp(metrics.started).strftime("%Y%m%d_%H%M%S")
+    return f"{directory}/{script}_{started}.{extension}"
+
+
+#############################
+# Writes the metrics of the run into a JSON file of its own in the metrics directory under the log directory.
+#############################
+def write_metrics(script):
+    path = run_path(script, "json")
+    with open(path, "w") as f:
+        json.dump(metrics.to_dict(), f, indent=4)
+    print(f"Metrics saved to {path}.")
+    return path
+
+
+#############################
+# Runs the code inside the block under cProfile if enabled. The profile is saved next to the metrics
+# (open it with e.g. snakeviz) and the functions with the most cumulative time are printed.
+# Only the calling thread is profiled; the download threads and worker processes are not.
+#############################
+@contextmanager
+def profiled(script, enabled=True):
+    if not enabled:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        path = run_path(script, "prof")
+        profiler.dump_stats(path)
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(20)
+        print(output.getvalue())
+        print(f"Profile saved to {path}.")
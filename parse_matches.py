@@ -1,125 +1,46 @@
+import argparse
 import constants
-import json
+import metrics
 import numpy as np
-import os
 import pandas as pd
-import requests
 import sys
+from analysis import aggregate_state
+from analysis import buildings
+from analysis import items
+from analysis import picks_bans
+from analysis import report
+from api_calls import game_constants
+from match_store import open_match_store
 
 
 #############################
-# Keep count of the destroyed buildings. 1 means building stands, 0 means building has fallen.
-# Convert integer bitmask to binary, and split the digits into list elements, and then sum them
-# together element-wise. This allows us to count which buildings are the most destroyed ones,
-# since a certain list element corresponds to a certain building.
+# The leaderboards are computed all at once by the report module; print them here and return them
+# so that they can be saved into the report file as well.
 #############################
-def update_building_counter(
-    match_json,
-    barracks_dire_counter,
-    barracks_radiant_counter,
-    towers_dire_counter,
-    towers_radiant_counter,
-):
-    # Barracks order: (2x NOT USED,) BOT RANGED, BOT MELEE, MID RANGED, MID MELEE, TOP RANGED, TOP MELEE
-    barracks_dire = [int(x) for x in format(match_json["barracks_status_dire"], "06b")]
-    barracks_radiant = [int(x) for x in format(match_json["barracks_status_radiant"], "06b")]
-
-    barracks_dire_counter = [sum(x) for x in zip(barracks_dire_counter, barracks_dire)]
-    barracks_radiant_counter = [sum(x) for x in zip(barracks_radiant_counter, barracks_radiant)]
-
-    # Towers order: (5x NOT USED,) BOT TIER 4, TOP TIER 4, BOT TIER 3, BOT TIER 2, BOT TIER 1,
-    #               MID TIER 3, MID TIER 2, MID TIER 1, TOP TIER 3, TOP TIER 2, TOP TIER 1
-    towers_dire = [int(x) for x in format(match_json["tower_status_dire"], "011b")]
-    towers_radiant = [int(x) for x in format(match_json["tower_status_radiant"], "011b")]
-
-    towers_dire_counter = [sum(x) for x in zip(towers_dire_counter, towers_dire)]
-    towers_radiant_counter = [sum(x) for x in zip(towers_radiant_counter, towers_radiant)]
-
-    return barracks_dire_counter, barracks_radiant_counter, towers_dire_counter, towers_radiant_counter
+def print_player_stats(player_aggregates, hero_table):
+    player_report = report.player_report(player_aggregates, hero_table)
 
-
-#############################
-# GO THROUGH PICKS AND BANS
-# Picks and their winrates could be deduced from the other DataFrame,
-# but this allows for more flexibility with bans and possibly pick orders as well.
-#############################
-def update_picks_and_bans(match_json, picks_and_bans_dict, hero_constants):
-    for pickban in match_json["picks_bans"]:
-        hero_id = str(pickban["hero_id"])
-
-        # Initialize hero if not in dict already
-        if hero_id not in picks_and_bans_dict:
-            picks_and_bans_dict[hero_id] = {
-                "hero_id": hero_id,
-                "hero_name": hero_constants[hero_id]["localized_name"],
-                "picked_games": 0,
-                "picked_wins": 0,
-                "banned_games": 0,
-                "banned_wins": 0,
-            }
-
-        # If the hero was picked, add to pick statistics. Check if the picking team won.
-        # Team 0 = radiant, 1 = dire
-        if pickban["is_pick"]:
-            picks_and_bans_dict[hero_id]["picked_games"] += 1
-
-            if (match_json["radiant_win"] and pickban["team"] == 0) or (
-                not match_json["radiant_win"] and pickban["team"] == 1
-            ):
-                picks_and_bans_dict[hero_id]["picked_wins"] += 1
-
-        # If the hero was banned instead, add to ban statistics. Check if the banning team won.
-        elif not pickban["is_pick"]:
-            picks_and_bans_dict[hero_id]["banned_games"] += 1
-
-            if (match_json["radiant_win"] and pickban["team"] == 0) or (
-                not match_json["radiant_win"] and pickban["team"] == 1
-            ):
-                picks_and_bans_dict[hero_id]["banned_wins"] += 1
-
-
-def print_player_stats(player_df: pd.DataFrame):
     # Print total sums of different stats
-    for c in constants.TOTAL_STATS:
-        print(f"Total {c}: {player_df[c].sum()}")
+    for c, total in player_report["totals"].items():
+        print(f"Total {c}: {total}")
 
     # Print 3 longest and shortest matches (in seconds) and their IDs
-    print(
-        "Longest matches:\n",
-        player_df[["duration", "match_id"]]
-        .drop_duplicates()
-        .sort_values(by="duration", ascending=False)
-        .head(3),
-    )
-
-    print(
-        "Shortest matches:\n",
-        player_df[["duration", "match_id"]]
-        .drop_duplicates()
-        .sort_values(by="duration", ascending=True)
-        .head(3),
-    )
+    print("Longest matches:\n", player_report["longest_matches"])
+    print("Shortest matches:\n", player_report["shortest_matches"])
 
     # Can't ensure all players have the same or recognizable profile name through all the games,
     # so just check the profiles manually for the most known nickname with the given ID.
     print("Players with most games:")
-    print(player_df["account_id"].value_counts().head(3))
+    print(player_report["most_games"])
 
     # Radiant/dire winrate
-    print(
-        player_df[["match_id", "radiant_win"]]
-        .drop_duplicates()["radiant_win"]
-        .value_counts()
-    )
+    print(player_report["radiant_win"])
 
     # Print the records and the players who got them for each stat with some extra info
-    for c in constants.HIGHEST_STATS:
-        print(
-            f"Most {c}:\n",
-            player_df.sort_values(by=c, ascending=False).head(3)[
-                [c, "hero_id", "hero_name", "account_id", "personaname", "match_id"]
-            ],
-        )
+    for c, records in player_report["records"].items():
+        print(f"Most {c}:\n", records)
+
+    return player_report
 
 
 def prepare_and_print_pickban_stats(pb_df: pd.DataFrame):
@@ -141,83 +62,45 @@ def prepare_and_print_pickban_stats(pb_df: pd.DataFrame):
         f.write(pb_output)
 
     # Print the characters with highest & lowest amount of games & winrate
-    # To avoid unnecessary copy/paste change column names when dealing with bans instead of picks
-    columns = ["picked_games", "picked_winrate", "banned_games", "banned_winrate"]
-    for col in columns:
-        column_names = (
-            ["picked_games", "picked_winrate"]
-            if "picked" in col
-            else ["banned_games", "banned_winrate"]
-        )
-        print(
-            f"Highest {col}:\n",
-            pb_df.sort_values(by=col, ascending=False).head(5)[
-                ["hero_id", "hero_name", column_names[0], column_names[1]]
-            ],
-        )
-        print(
-            f"Lowest {col}:\n",
-            pb_df.sort_values(by=col, ascending=True).head(5)[
-                ["hero_id", "hero_name", column_names[0], column_names[1]]
-            ],
-        )
+    pickban_report = report.pickban_report(pb_df)
+    for col in pickban_report["highest"]:
+        print(f"Highest {col}:\n", pickban_report["highest"][col])
+        print(f"Lowest {col}:\n", pickban_report["lowest"][col])
 
+    return pickban_report
 
-def main():
-    # Fetch the mapping for hero IDs and names.
-    r = requests.get("https://api.opendota.com/api/constants/heroes")
-    if r.status_code != 200:
-        print(
-            f"Could not fetch hero data due to unknown error {r.status_code}."
-            "Try running this script again."
-        )
-        sys.exit(1)
-    hero_constants = r.json()
-
-    # This has the names for all of the downloaded match replay files.
-    match_files = os.listdir(constants.MATCH_DIRECTORY)
-
-    # Represented by integer bitmasks, keep count by splitting binary representation to digits.
-    # Even though they are represented by 8-bit and 16-bit binaries, respectively only 6 and 11 of
-    # those digits are used and thus meaningful. See below for more explanation.
-    barracks_dire_counter = [0] * 6
-    barracks_radiant_counter = [0] * 6
-
-    towers_dire_counter = [0] * 11
-    towers_radiant_counter = [0] * 11
-
-    # These are used to construct the DataFrames later on
-    dataframe_rows = []
-    picks_and_bans_dict = {}
-
-    # Go through each match
-    for file in match_files:
-        with open(f"{constants.MATCH_DIRECTORY}/{file}", "r") as f:
-            match_json = json.load(f)
-
-        (
-            barracks_dire_counter,
-            barracks_radiant_counter,
-            towers_dire_counter,
-            towers_radiant_counter
-        ) = update_building_counter(
-            match_json,
-            barracks_dire_counter,
-            barracks_radiant_counter,
-            towers_dire_counter,
-            towers_radiant_counter,
-        )
-
-        update_picks_and_bans(match_json, picks_and_bans_dict, hero_constants)
-
-        # Go through players
-        for player in match_json["players"]:
-            # Define keys which to keep from this huge object, import them from another file due to size.
-            # Add hero name manually.
-            player_keys = constants.PLAYER_KEYS
-            player_dict = {k: v for k, v in player.items() if k in player_keys}
-            player_dict["hero_name"] = hero_constants[str(player["hero_id"])]["localized_name"]
-            dataframe_rows.append(player_dict)
+
+#############################
+# Item usage and winrates, and the most used items of each hero. The full tables are saved as CSV files.
+#############################
+def print_item_stats(aggregates, hero_table, item_table):
+    item_df = items.item_stats(aggregates["items"], aggregates["hero_games"], item_table)
+    item_df.to_csv(f"{constants.LOG_DIRECTORY}/items.csv", index=False)
+    items.hero_builds(aggregates["hero_items"], aggregates["hero_games"], hero_table, item_table).to_csv(
+        f"{constants.LOG_DIRECTORY}/hero_item_builds.csv", index=False
+    )
+
+    item_report = report.item_report(item_df)
+    print("Most used items:\n", item_report["most_used"])
+    print("Highest item winrates:\n", item_report["highest_winrate"])
+    print("Lowest item winrates:\n", item_report["lowest_winrate"])
+    return item_report
+
+
+#############################
+# Prints the statistics, and saves them into the CSV files and the report file in the log directory.
+#############################
+def report_matches(aggregates, hero_table, item_table):
+    # Represented by integer bitmasks, keep count of the standing buildings by splitting them into bits.
+    # Barracks order: (2x NOT USED,) BOT RANGED, BOT MELEE, MID RANGED, MID MELEE, TOP RANGED, TOP MELEE
+    # Towers order: (5x NOT USED,) BOT TIER 4, TOP TIER 4, BOT TIER 3, BOT TIER 2, BOT TIER 1,
+    #               MID TIER 3, MID TIER 2, MID TIER 1, TOP TIER 3, TOP TIER 2, TOP TIER 1
+    (
+        barracks_dire_counter,
+        barracks_radiant_counter,
+        towers_dire_counter,
+        towers_radiant_counter
+    ) = aggregates["standing"]
 
     #############################
     # QUERYING THE INFORMATION
@@ -226,15 +109,37 @@ def main():
     # Printing into console works fine for the purposes of this script;
     # this could be aggregated into some file as well.
     #############################
-    player_df = pd.DataFrame(dataframe_rows)
-    print_player_stats(player_df)
+    player_report = print_player_stats(aggregates["players"], hero_table)
 
     #############################
-    # Pick and ban stats of different characters
-    # Prepare dictionary into dataframe and add columns for winrates
+    # GO THROUGH PICKS AND BANS
+    # Picks and their winrates could be deduced from the other DataFrame,
+    # but this allows for more flexibility with bans and pick orders as well.
+    # Pick and ban stats of different characters, with columns for winrates
     #############################
-    pb_df = pd.DataFrame(list(picks_and_bans_dict.values()))
-    prepare_and_print_pickban_stats(pb_df)
+    pb_df = picks_bans.hero_stats(aggregates["heroes"], hero_table)
+    pickban_report = prepare_and_print_pickban_stats(pb_df)
+
+    first_pick_df = picks_bans.first_pick_stats(aggregates["heroes"], hero_table)
+    print(
+        "Most common first picks:\n",
+        first_pick_df.sort_values(by="first_picked_games", ascending=False).head(5)[
+            ["hero_id", "hero_name", "first_picked_games", "first_pick_rate"]
+        ],
+    )
+
+    pairs_df = picks_bans.hero_pairs(aggregates["pairs"], hero_table)
+    print("Most common hero pairings:\n", pairs_df.head(5))
+
+    # Per phase stats and all the pairings are large tables, so save them to files as well
+    picks_bans.phase_stats(
+        aggregates["phases"], aggregates["pickban_matches"], hero_table
+    ).to_csv(
+        f"{constants.LOG_DIRECTORY}/picks_and_bans_by_phase.csv", index=False
+    )
+    pairs_df.to_csv(f"{constants.LOG_DIRECTORY}/hero_pairings.csv", index=False)
+
+    item_report = print_item_stats(aggregates, hero_table, item_table)
 
     # Remaining misc prints
     print("Barracks dire: ", barracks_dire_counter)
@@ -242,8 +147,68 @@ def main():
     print("Towers dire: ", towers_dire_counter)
     print("Towers radiant: ", towers_radiant_counter)
 
+    # Destruction rates by match outcome and duration are a large table as well, so save them to a file
+    buildings.destruction_rates(aggregates["destruction"]).to_csv(
+        f"{constants.LOG_DIRECTORY}/building_destruction_rates.csv", index=False
+    )
+
+    # Save everything that was printed above (and a bit more) in a structured form as well
+    report.write_report(
+        f"{constants.LOG_DIRECTORY}/report.json",
+        {
+            "matches": aggregates["matches"],
+            "players": player_report,
+            "picks_and_bans": pickban_report,
+            "first_picks": first_pick_df.nlargest(5, "first_picked_games"),
+            "hero_pairings": pairs_df.head(5),
+            "items": item_report,
+            "barracks_standing": {"dire": barracks_dire_counter, "radiant": barracks_radiant_counter},
+            "towers_standing": {"dire": towers_dire_counter, "radiant": towers_radiant_counter},
+        },
+    )
+
+
+def parse_matches(args):
+    # The mappings for hero and item IDs and names. They are cached on disk,
+    # and fetched again only once they are old.
+    with metrics.stage("load_constants"):
+        hero_table = game_constants.hero_names(refresh=args.refresh_constants)
+        item_table = game_constants.item_names(refresh=args.refresh_constants)
+
+    # This has all of the downloaded match replays. The stats are aggregated into a state that is kept
+    # on disk along with the IDs of the matches in it, so only the new matches need to be gone through.
+    store = open_match_store()
+    state = aggregate_state.AggregateState() if args.rebuild else aggregate_state.load_state()
+    aggregate_state.update_state(state, store, args.workers)
+    if state.aggregates is None:
+        print("No matches to parse.")
+        sys.exit(1)
+    aggregate_state.save_state(state)
+    with metrics.stage("report"):
+        report_matches(state.aggregates, hero_table, item_table)
+
     print("Program ran successfully.")
 
 
+def main():
+    # Decoding the matches is CPU bound; with more than one worker they are extracted in separate processes.
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1)
+    # Throws away the aggregated stats and goes through all the matches again
+    parser.add_argument("--rebuild", action="store_true")
+    # Fetches the hero and item constants again even if the cached ones are recent
+    parser.add_argument("--refresh-constants", action="store_true")
+    # Run under cProfile and save the profile next to the metrics
+    parser.add_argument("--profile", action="store_true")
+    args = parser.parse_args()
+
+    # The metrics of the run are saved into the log directory even if it fails midway
+    try:
+        with metrics.profiled("parse_matches", args.profile):
+            parse_matches(args)
+    finally:
+        metrics.write_metrics("parse_matches")
+
+
 if __name__ == "__main__":
     main()